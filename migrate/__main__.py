@@ -1,25 +1,83 @@
 import click
-from .commands.start import start
-from .commands.report import report
-from .commands.stats import stats
-from .commands.load import load
-from .commands.scripts import scripts
-from .commands.get import get
-from .commands.snapshots import snapshots
-
-
-@click.group()
-def cli():
-    pass
-
-
-cli.add_command(start)
-cli.add_command(report)
-cli.add_command(stats)
-cli.add_command(load)
-cli.add_command(scripts)
-cli.add_command(get)
-cli.add_command(snapshots)
+import importlib
+
+from migrate.metrics import metrics, METRICS_DIR
+
+
+class LazyGroup(click.Group):
+    """A group that only imports a subcommand's module when it's invoked
+
+    Most commands pull in pandas, openpyxl and githubkit, so importing them
+    all up front makes even `--help` slow.
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Command name -> ("module.command", "short help")
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+
+        import_path, _ = self.lazy_subcommands[cmd_name]
+        module_name, command_name = import_path.rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), command_name)
+
+    def format_commands(self, ctx, formatter):
+        # Use the short help given up front, rather than importing every command
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_subcommands:
+                rows.append((name, self.lazy_subcommands[name][1]))
+            else:
+                rows.append((name, self.commands[name].get_short_help_str()))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "start": ("migrate.commands.start.start", "Create a migration workbook"),
+        "report": ("migrate.commands.report.report", "Generate reports"),
+        "stats": (
+            "migrate.commands.stats.stats",
+            "Capture stats on the source/target environments",
+        ),
+        "load": (
+            "migrate.commands.load.load",
+            "Load .csv files into the migration workbook",
+        ),
+        "scripts": ("migrate.commands.scripts.scripts", "Generate migration scripts"),
+        "get": ("migrate.commands.get.get", "Download migration logs"),
+        "snapshots": (
+            "migrate.commands.snapshots.snapshots",
+            "Capture issue and PR snapshots of the source/target environments",
+        ),
+        "bench": ("migrate.commands.bench.bench", "Benchmark gh migrate itself"),
+        "export": (
+            "migrate.commands.export.export",
+            "Write CSV copies of Parquet stats and snapshots",
+        ),
+    },
+)
+@click.option(
+    "--metrics-dir",
+    default=METRICS_DIR,
+    show_default=True,
+    help="Directory each command's timings and API calls are written to",
+)
+@click.option("--no-metrics", is_flag=True, help="Don't write metrics")
+def cli(metrics_dir, no_metrics):
+    metrics.directory = None if no_metrics else metrics_dir
+
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,439 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from functools import lru_cache
+from dataclasses import dataclass
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+###############################################################################
+# A stand-in for api.github.com, for benchmarking without hitting GitHub
+#
+# It serves synthetic orgs named bench-org-0, bench-org-1, ... with the REST
+# endpoints used by `stats` and `snapshots` and the GraphQL queries under
+# migrate/graphql/. Queries are recognised by their shape rather than parsed,
+# so a new query needs a matching branch in `graphql()`.
+#
+# Every response can be delayed by a fixed latency, and each token gets a
+# primary rate limit that resets every `window` seconds. Point the CLI at it
+# with GH_MIGRATE_API_URL, e.g.
+#
+#   python -m migrate.bench.fakegithub --port 8000 --repos 500 &
+#   GH_MIGRATE_API_URL=http://127.0.0.1:8000/ gh migrate stats ...
+###############################################################################
+
+ORG_PREFIX = "bench-org-"
+
+
+@dataclass
+class FakeGitHubConfig:
+    orgs: int = 2
+    repos: int = 100
+    max_issues: int = 50
+    max_pulls: int = 50
+    teams: int = 10
+    members: int = 50
+    latency: float = 0.0
+    rate_limit: int = 5000
+    window: float = 3600.0
+    seed: int = 0
+
+
+class FakeGitHub:
+    """The synthetic orgs, and the responses to requests about them"""
+
+    def __init__(self, config):
+        self.config = config
+        self.requests = 0
+        self.budgets = {}
+        self.lock = threading.Lock()
+
+    ##########################################
+    # Synthetic data
+    ##########################################
+    def org_names(self):
+        return [f"{ORG_PREFIX}{i}" for i in range(self.config.orgs)]
+
+    def repo_names(self, org):
+        return [f"repo-{i:05d}" for i in range(self.config.repos)]
+
+    @lru_cache(maxsize=None)
+    def repo(self, org, name):
+        """Counts for one repo, the same for every run with the same seed"""
+        rng = random.Random(f"{self.config.seed}/{org}/{name}")
+        return {
+            "issues": rng.randint(0, self.config.max_issues),
+            "pulls": rng.randint(0, self.config.max_pulls),
+            "branches": rng.randint(1, 20),
+            "hooks": rng.randint(0, 3),
+            "workflows": rng.randint(0, 5),
+            "teams": rng.sample(range(self.config.teams), min(3, self.config.teams)),
+            "disk_usage": rng.randint(1, 500_000),
+            "archived": rng.random() < 0.1,
+            "pushed_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            "T00:00:00Z",
+        }
+
+    def issue(self, org, name, index):
+        rng = random.Random(f"{org}/{name}/issue/{index}")
+        return {
+            "comments": {"totalCount": rng.randint(0, 20)},
+            "timelineItems": {"totalCount": rng.randint(1, 40)},
+        }
+
+    def pull(self, org, name, index):
+        rng = random.Random(f"{org}/{name}/pull/{index}")
+        return {
+            "comments": {"totalCount": rng.randint(0, 20)},
+            "commits": {"totalCount": rng.randint(1, 30)},
+            "timelineItems": {"totalCount": rng.randint(1, 60)},
+        }
+
+    def repo_fields(self, org, name):
+        repo = self.repo(org, name)
+        return {
+            "name": name,
+            "owner": {"login": org},
+            "isLocked": False,
+            "lockReason": None,
+            "branches": {"totalCount": repo["branches"]},
+            "branchProtectionRules": {"totalCount": 1},
+            "commitComments": {"totalCount": 0},
+            "collaborators": {"totalCount": 5},
+            "createdAt": "2020-01-01T00:00:00Z",
+            "diskUsage": repo["disk_usage"],
+            "discussions": {"totalCount": 0},
+            "hasWikiEnabled": True,
+            "isFork": False,
+            "forkCount": 0,
+            "isArchived": repo["archived"],
+            "issues": self.page(
+                [self.issue(org, name, i) for i in range(min(repo["issues"], 1))],
+                repo["issues"],
+                None,
+                1,
+            ),
+            "milestones": {"totalCount": 0},
+            "packages": {"totalCount": 0},
+            "projects": {"totalCount": 0},
+            "pullRequests": self.page(
+                [self.pull(org, name, i) for i in range(min(repo["pulls"], 1))],
+                repo["pulls"],
+                None,
+                1,
+            ),
+            "pushedAt": repo["pushed_at"],
+            "releases": {"totalCount": 0},
+            "tags": {"totalCount": 0},
+            "updatedAt": repo["pushed_at"],
+            "url": f"https://github.com/{org}/{name}",
+        }
+
+    def page(self, nodes, total, cursor, size):
+        """A GraphQL connection, `nodes` is every node from `cursor` on"""
+        start = int(cursor or 0)
+        return {
+            "totalCount": total,
+            "pageInfo": {
+                "hasNextPage": start + size < total,
+                "endCursor": str(start + size),
+            },
+            "nodes": nodes[:size],
+        }
+
+    ##########################################
+    # GraphQL
+    ##########################################
+    def graphql(self, query, variables):
+        size = variables.get("pageSize", 100)
+        cursor = variables.get("endCursor")
+
+        if "organization(login" in query:
+            org = variables["login"]
+            names = self.repo_names(org)
+            start = int(cursor or 0)
+            if "RepoFields" in query:
+                nodes = [self.repo_fields(org, n) for n in names[start : start + size]]
+            else:
+                nodes = [
+                    {
+                        "name": n,
+                        "owner": {"login": org},
+                        "pushedAt": self.repo(org, n)["pushed_at"],
+                        "updatedAt": self.repo(org, n)["pushed_at"],
+                    }
+                    for n in names[start : start + size]
+                ]
+            repositories = self.page(nodes, len(names), cursor, size)
+            repositories["totalDiskUsage"] = 0
+            return {"organization": {"repositories": repositories}}
+
+        # Batched queries, aliased r0, r1, ...
+        aliases = re.findall(r"\b(r\d+): repository\(", query)
+        if aliases:
+            data = {}
+            for alias in aliases:
+                i = alias[1:]
+                org, name = variables[f"owner{i}"], variables[f"name{i}"]
+                data[alias] = self.repository(query, org, name, size, None)
+            return data
+
+        org, name = variables["owner"], variables["name"]
+        return {"repository": self.repository(query, org, name, size, cursor)}
+
+    def repository(self, query, org, name, size, cursor):
+        repo = self.repo(org, name)
+        start = int(cursor or 0)
+        issues = [
+            self.issue(org, name, i)
+            for i in range(start, min(start + size, repo["issues"]))
+        ]
+        pulls = [
+            self.pull(org, name, i)
+            for i in range(start, min(start + size, repo["pulls"]))
+        ]
+
+        data = {"owner": {"login": org}, "name": name}
+        if "fragment RepoFields" in query:
+            data.update(self.repo_fields(org, name))
+        if "fragment RepoPages" in query:
+            data["issuesPage"] = self.page(issues, repo["issues"], None, size)
+            data["pullRequestsPage"] = self.page(pulls, repo["pulls"], None, size)
+        elif "pullRequests(first: $pageSize" in query:
+            data["pullRequests"] = self.page(pulls, repo["pulls"], cursor, size)
+        elif "issues(first: $pageSize" in query:
+            data["issues"] = self.page(issues, repo["issues"], cursor, size)
+
+        return data
+
+    ##########################################
+    # REST
+    ##########################################
+    def rest(self, path, params):
+        """Returns the status and JSON body for a GET"""
+        parts = path.strip("/").split("/")
+        page = int(params.get("page", 1))
+        per_page = int(params.get("per_page", 30))
+
+        def paginate(items):
+            return 200, items[(page - 1) * per_page : page * per_page]
+
+        def total(key, count, item=None):
+            return 200, {"total_count": count, key: [item or {}] * count}
+
+        if parts[0] == "repos" and len(parts) >= 3:
+            org, name, tail = parts[1], parts[2], "/".join(parts[3:])
+            if org not in self.org_names() or name not in self.repo_names(org):
+                return 404, {"message": "Not Found"}
+            repo = self.repo(org, name)
+
+            if tail == "":
+                return 200, {
+                    "name": name,
+                    "topics": ["bench"],
+                    "permissions": {"admin": True, "push": True, "pull": True},
+                    "visibility": "private",
+                    "security_and_analysis": None,
+                }
+            if tail == "hooks":
+                return paginate([{"id": i} for i in range(repo["hooks"])])
+            if tail == "actions/workflows":
+                return total("workflows", repo["workflows"])
+            if tail == "actions/runs":
+                return total(
+                    "workflow_runs",
+                    repo["workflows"],
+                    {"created_at": repo["pushed_at"]},
+                )
+            if tail == "branches":
+                return paginate(
+                    [{"name": f"branch-{i}"} for i in range(repo["branches"])]
+                )
+            if tail == "teams":
+                return paginate([{"name": f"team-{t}"} for t in repo["teams"]])
+            if tail == "environments":
+                return total("environments", 0)
+            if tail in (
+                "actions/secrets",
+                "actions/organization-secrets",
+                "dependabot/secrets",
+                "codespaces/secrets",
+            ):
+                return total("secrets", 0)
+            return 404, {"message": "Not Found"}
+
+        if parts[0] == "orgs" and len(parts) >= 3:
+            org, tail = parts[1], "/".join(parts[2:])
+            if org not in self.org_names():
+                return 404, {"message": "Not Found"}
+
+            members = [
+                {"login": f"user-{i}", "id": i, "type": "User"}
+                for i in range(self.config.members)
+            ]
+            if tail == "members":
+                return paginate(members)
+            if tail == "repos":
+                return paginate(
+                    [
+                        {"name": n, "full_name": f"{org}/{n}"}
+                        for n in self.repo_names(org)
+                    ]
+                )
+            if tail == "teams":
+                return paginate(
+                    [
+                        {"slug": f"team-{t}", "name": f"team-{t}", "id": t}
+                        for t in range(self.config.teams)
+                    ]
+                )
+
+            match = re.fullmatch(r"teams/team-(\d+)/(repos|members)", tail)
+            if match:
+                team = int(match.group(1))
+                if match.group(2) == "repos":
+                    return paginate(
+                        [
+                            {"name": n, "full_name": f"{org}/{n}"}
+                            for n in self.repo_names(org)
+                            if team in self.repo(org, n)["teams"]
+                        ]
+                    )
+
+                # Every fifth member of a team is one of its maintainers
+                team_members = members[team % 7 :: 3]
+                if params.get("role") == "maintainer":
+                    team_members = team_members[::5]
+                return paginate(team_members)
+
+        return 404, {"message": "Not Found"}
+
+    ##########################################
+    # Rate limits
+    ##########################################
+    def charge(self, token, resource):
+        """Counts a request against the token's budget, returns its headers"""
+        with self.lock:
+            self.requests += 1
+
+            now = time.time()
+            budget = self.budgets.get((token, resource))
+            if budget is None or budget["reset"] <= now:
+                budget = {
+                    "remaining": self.config.rate_limit,
+                    "reset": now + self.config.window,
+                }
+                self.budgets[(token, resource)] = budget
+
+            budget["remaining"] -= 1
+            return {
+                "x-ratelimit-limit": str(self.config.rate_limit),
+                "x-ratelimit-remaining": str(max(budget["remaining"], 0)),
+                "x-ratelimit-reset": str(int(budget["reset"])),
+                "x-ratelimit-resource": resource,
+                "x-ratelimit-used": str(self.config.rate_limit - budget["remaining"]),
+            }, budget["remaining"] >= 0
+
+    def handle(self, method, url, headers, body):
+        """Returns the status, headers and JSON body of a response"""
+        time.sleep(self.config.latency)
+
+        url = urlsplit(url)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        resource = "graphql" if url.path.endswith("/graphql") else "core"
+
+        rate_limit, allowed = self.charge(
+            headers.get("authorization", "anonymous"), resource
+        )
+        if not allowed:
+            return 403, rate_limit, {"message": "API rate limit exceeded"}
+
+        if method == "POST" and resource == "graphql":
+            request = json.loads(body)
+            data = self.graphql(request["query"], request.get("variables") or {})
+            data["rateLimit"] = {
+                "cost": 1,
+                "remaining": int(rate_limit["x-ratelimit-remaining"]),
+                "resetAt": "",
+            }
+            return 200, rate_limit, {"data": data}
+
+        status, data = self.rest(url.path, params)
+        return status, rate_limit, data
+
+
+def make_handler(github):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def respond(self):
+            length = int(self.headers.get("content-length") or 0)
+            body = self.rfile.read(length) if length else b""
+            headers = {k.lower(): v for k, v in self.headers.items()}
+
+            status, response_headers, data = github.handle(
+                self.command, self.path, headers, body
+            )
+            content = json.dumps(data).encode()
+
+            self.send_response(status)
+            self.send_header("content-type", "application/json; charset=utf-8")
+            self.send_header("content-length", str(len(content)))
+            for name, value in response_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = respond
+        do_POST = respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(config, host="127.0.0.1", port=0):
+    """Starts a fake GitHub in a background thread, returns the server
+
+    Its `github` attribute is the FakeGitHub, and `url` its base URL.
+    """
+    github = FakeGitHub(config)
+    server = ThreadingHTTPServer((host, port), make_handler(github))
+    server.daemon_threads = True
+    server.github = github
+    server.url = f"http://{host}:{server.server_address[1]}/"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake GitHub API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    for name, default in vars(FakeGitHubConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default))
+    args = parser.parse_args()
+
+    config = FakeGitHubConfig(
+        **{
+            name: value
+            for name, value in vars(args).items()
+            if name in vars(FakeGitHubConfig()) and value is not None
+        }
+    )
+    server = serve(config, args.host, args.port)
+    print(f"* Serving {config.orgs} fake orgs at {server.url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
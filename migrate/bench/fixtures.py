@@ -0,0 +1,278 @@
+import os
+import csv
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from migrate.statsfile import stats_columns
+
+###############################################################################
+# Synthetic inputs for `gh migrate report`
+#
+# Lays out a wave the way `report` finds it in the logs directory:
+#
+#   <output_dir>/<target org>/README.md             org migration log
+#   <output_dir>/<target org>/success/<repo>.txt    repo migration logs
+#   <output_dir>/<target org>/failure/<repo>.txt
+#   <output_dir>/before-source-wave-<N>.csv         `gh migrate stats` results
+#   <output_dir>/after-source-wave-<N>.csv
+#   <output_dir>/after-target-wave-<N>.csv
+#
+# Repos that fail to migrate are missing from the target stats, and a few of
+# the migrated ones drift (e.g. webhooks, which GEI doesn't migrate), so the
+# stats report has differences to find. The same seed gives the same files.
+###############################################################################
+
+ORG_PREFIX = "bench-org-"
+
+# Target orgs are the source orgs with this suffix
+TARGET_SUFFIX = "-migrated"
+
+# Messages GEI logs for things it couldn't migrate
+WARNINGS = [
+    "Unable to migrate pull request review comment on outdated diff",
+    "Attachment could not be migrated and was replaced with a link",
+    "User mannequin created for unmapped author",
+    "Issue event could not be imported because the actor was not found",
+    "Git LFS objects are not migrated",
+]
+ERRORS = [
+    "Repository exceeds the maximum git object size",
+    "Timed out waiting for the export archive",
+    "Failed to import pull request, the base branch no longer exists",
+    "Git source migration failed, the remote rejected the push",
+]
+
+# Steps logged between the start and the end of every repo migration
+STEPS = [
+    "Queued for export",
+    "Exporting git data",
+    "Exporting metadata",
+    "Uploading archives",
+    "Importing git data",
+    "Importing metadata",
+    "Rewriting references",
+]
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+@dataclass
+class ReportFixtureConfig:
+    orgs: int = 2
+    repos: int = 500
+    wave: int = 1
+    failure_rate: float = 0.02
+    warning_rate: float = 0.05
+    drift_rate: float = 0.05
+    seed: int = 0
+
+
+def source_org_names(config):
+    return [f"{ORG_PREFIX}{i}" for i in range(config.orgs)]
+
+
+def org_mapping(config):
+    """Source org to target org, as the mapping index would give it"""
+    return {org: f"{org}{TARGET_SUFFIX}" for org in source_org_names(config)}
+
+
+def timestamp(time):
+    return time.strftime(TIMESTAMP_FORMAT)
+
+
+def repo_log(rng, source, target, start, failed, warning_rate):
+    """The lines of a repo's migration log, and when it ended
+
+    Each step logs a warning with probability `warning_rate`.
+    """
+    time = start
+    lines = [
+        f"# Migration log for {target}",
+        "",
+        f"[{timestamp(time)}] [INFO] Migration started: {source} -> {target}",
+    ]
+
+    for step in STEPS:
+        time += timedelta(seconds=rng.randint(5, 300))
+        lines.append(f"[{timestamp(time)}] [INFO] {step}")
+
+        if rng.random() < warning_rate:
+            time += timedelta(seconds=rng.randint(1, 30))
+            lines.append(f"[{timestamp(time)}] [WARN] {rng.choice(WARNINGS)}")
+
+    if failed:
+        time += timedelta(seconds=rng.randint(1, 60))
+        error = rng.choice(ERRORS)
+        lines.append(f"[{timestamp(time)}] [ERROR] {error}")
+        lines.append(f"[{timestamp(time)}] [ERROR] Migration failed: {error}")
+    else:
+        time += timedelta(seconds=rng.randint(1, 60))
+        lines.append(f"[{timestamp(time)}] [INFO] Migration complete")
+
+    return lines, time
+
+
+def stats_row(rng, org, name, source, inventoried):
+    """A row of `gh migrate stats` results, as strings"""
+    issues = rng.randint(0, 200)
+    pulls = rng.randint(0, 200)
+    pushed = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z"
+
+    return {
+        "name": name,
+        "isLocked": "False",
+        "lockReason": "",
+        "branches": str(["main"] + [f"feature-{i}" for i in range(rng.randint(0, 3))]),
+        "createdAt": "2020-01-01T00:00:00Z",
+        "diskUsage": str(rng.randint(1, 500_000)),
+        "hasWikiEnabled": str(rng.random() < 0.5),
+        "isFork": "False",
+        "forkCount": str(rng.randint(0, 5)),
+        "isArchived": str(rng.random() < 0.1),
+        "pushedAt": pushed,
+        "updatedAt": pushed,
+        "url": f"https://github.com/{org}/{name}",
+        "lastWorkflowRun": pushed if rng.random() < 0.6 else "",
+        "teams": str([f"team-{i}" for i in rng.sample(range(10), 2)]),
+        "environments": str(rng.randint(0, 3)),
+        "secrets_actions_repo": str(rng.randint(0, 10)),
+        "secrets_actions_org": str(rng.randint(0, 5)),
+        "secrets_dependabot": str(rng.randint(0, 2)),
+        "secrets_codespaces": "0",
+        "topics": "",
+        "visibility": rng.choice(["private", "internal"]),
+        "hasGitLFS": str(rng.random() < 0.05),
+        "Source": source,
+        "Inventoried": inventoried,
+        "owner.login": org,
+        "branchProtectionRules.totalCount": str(rng.randint(0, 3)),
+        "commitComments.totalCount": str(rng.randint(0, 10)),
+        "collaborators.totalCount": str(rng.randint(1, 30)),
+        "discussions.totalCount": "0",
+        "issues.totalCount": str(issues),
+        "issues.comments.totalCount": str(issues * rng.randint(0, 5)),
+        "issues.timelineItems.totalCount": str(issues * rng.randint(1, 10)),
+        "milestones.totalCount": str(rng.randint(0, 5)),
+        "packages.totalCount": "0",
+        "projects.totalCount": str(rng.randint(0, 2)),
+        "pullRequests.totalCount": str(pulls),
+        "pullRequests.comments.totalCount": str(pulls * rng.randint(0, 5)),
+        "pullRequests.commits.totalCount": str(pulls * rng.randint(1, 10)),
+        "pullRequests.timelineItems.totalCount": str(pulls * rng.randint(1, 15)),
+        "releases.totalCount": str(rng.randint(0, 20)),
+        "tags.totalCount": str(rng.randint(0, 40)),
+        "webhooks.totalCount": str(rng.randint(0, 3)),
+        "workflows.totalCount": str(rng.randint(0, 5)),
+        "permissions.admin": "True",
+        "permissions.maintain": "True",
+        "permissions.push": "True",
+        "permissions.triage": "True",
+        "permissions.pull": "True",
+    }
+
+
+def drift(rng, row):
+    """Changes a migrated repo's row the way the target can differ"""
+    column = rng.choice(
+        [
+            "webhooks.totalCount",
+            "pullRequests.comments.totalCount",
+            "releases.totalCount",
+            "collaborators.totalCount",
+        ]
+    )
+    row[column] = str(max(0, int(row[column]) - rng.randint(1, 3)))
+
+
+def generate_report_fixture(config, output_dir, logs=True):
+    """Writes a wave's logs and stats to `output_dir`, returns the counts
+
+    Without `logs`, only the stats are written.
+    """
+    rng = random.Random(config.seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    wave = config.wave
+    csvs = {
+        name: open(os.path.join(output_dir, f"{name}-wave-{wave}.csv"), "w", newline="")
+        for name in ["before-source", "after-source", "after-target"]
+    }
+    writers = {
+        name: csv.DictWriter(f, fieldnames=stats_columns(), restval="")
+        for name, f in csvs.items()
+    }
+    for writer in writers.values():
+        writer.writeheader()
+
+    counts = {"repos": 0, "failed": 0, "warnings": 0, "drifted": 0}
+    wave_start = datetime(2024, 4, 12, 1, 0, 0)
+
+    try:
+        for source_org, target_org in org_mapping(config).items():
+            org_dir = os.path.join(output_dir, target_org)
+            for type in ["success", "failure"] if logs else []:
+                os.makedirs(os.path.join(org_dir, type), exist_ok=True)
+
+            org_end = wave_start
+            for index in range(config.repos):
+                name = f"repo-{index:05d}"
+                failed = rng.random() < config.failure_rate
+
+                # GEI runs a handful of migrations at a time
+                start = wave_start + timedelta(seconds=(index // 5) * 60)
+                lines, end = repo_log(
+                    rng,
+                    f"{source_org}/{name}",
+                    f"{target_org}/{name}",
+                    start,
+                    failed,
+                    config.warning_rate,
+                )
+                org_end = max(org_end, end)
+
+                type = "failure" if failed else "success"
+                if logs:
+                    with open(os.path.join(org_dir, type, f"{name}.txt"), "w") as f:
+                        f.write("\n".join(lines) + "\n")
+
+                counts["repos"] += 1
+                counts["failed"] += failed
+                counts["warnings"] += sum("[WARN]" in line for line in lines)
+
+                row = stats_row(rng, source_org, name, "source", timestamp(wave_start))
+                writers["before-source"].writerow(row)
+
+                # Migrated repos are locked in the source
+                after = dict(row, Inventoried=timestamp(org_end))
+                if not failed:
+                    after.update(isLocked="True", lockReason="MIGRATING")
+                writers["after-source"].writerow(after)
+
+                if failed:
+                    continue
+
+                target = dict(row, Source="target", Inventoried=timestamp(org_end))
+                target["owner.login"] = target_org
+                target["url"] = f"https://github.com/{target_org}/{name}"
+                if rng.random() < config.drift_rate:
+                    drift(rng, target)
+                    counts["drifted"] += 1
+                writers["after-target"].writerow(target)
+
+            if not logs:
+                continue
+
+            with open(os.path.join(org_dir, "README.md"), "w") as f:
+                f.write(f"# Migration results for {target_org}\n\n")
+                f.write(
+                    f"[{timestamp(wave_start)}] [INFO] Organization migration started\n"
+                )
+                f.write(
+                    f"[{timestamp(org_end)}] [INFO] Organization migration completed\n"
+                )
+    finally:
+        for f in csvs.values():
+            f.close()
+
+    return counts
@@ -0,0 +1,61 @@
+import os
+import time
+import tempfile
+
+import pandas as pd
+
+from migrate.bench.fixtures import generate_report_fixture
+from migrate.statsfile import read_stats
+from migrate.tables import COMPRESSION, parquet_available
+
+###############################################################################
+# Memory held by a loaded inventory
+#
+# A wave's before-source stats are generated, then loaded each way the
+# commands have read them: with pandas' inferred dtypes, as all strings, and
+# with the stats schema, from CSV and from Parquet.
+###############################################################################
+
+
+def measure_memory(config):
+    """Size in memory and load time of `config`'s stats, by loader"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        generate_report_fixture(config, temp_dir, logs=False)
+        path = os.path.join(temp_dir, f"before-source-wave-{config.wave}.csv")
+
+        loaders = {
+            "inferred": lambda: pd.read_csv(
+                path, parse_dates=["updatedAt", "pushedAt"]
+            ),
+            "strings": lambda: pd.read_csv(path, dtype=str),
+            "schema (csv)": lambda: read_stats(path),
+        }
+
+        if parquet_available():
+            parquet_path = os.path.join(temp_dir, "stats.parquet")
+            read_stats(path).to_parquet(
+                parquet_path, index=False, compression=COMPRESSION
+            )
+            loaders["schema (parquet)"] = lambda: read_stats(parquet_path)
+
+        results = []
+        for name, load in loaders.items():
+            start = time.perf_counter()
+            df = load()
+            seconds = time.perf_counter() - start
+
+            results.append(
+                {
+                    "loader": name,
+                    "repos": len(df),
+                    "seconds": seconds,
+                    "memory_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+                }
+            )
+
+    # How many times smaller than reading every value as a string
+    strings = results[1]["memory_mb"]
+    for result in results:
+        result["vs_strings"] = strings / result["memory_mb"]
+
+    return results
@@ -0,0 +1,74 @@
+import os
+import time
+import shutil
+import tempfile
+import contextlib
+
+from migrate.bench.fixtures import generate_report_fixture, org_mapping
+
+###############################################################################
+# `gh migrate report` on a synthetic wave
+#
+# The wave's logs and stats are generated first (or reused), then each stage
+# of the report is timed on its own: parsing the GEI logs, comparing the
+# stats, and writing the sheets to a copy of the workbook template.
+###############################################################################
+
+
+def measure_report(config, fixture_dir=None):
+    """Times each stage of the report on `config`'s wave
+
+    With a `fixture_dir` that already has the wave's files, they're reused
+    instead of generated.
+    """
+    from migrate.commands.report import generate_gei_reports, generate_stats_report
+    from migrate.workbook import workbook_session, add_worksheet
+
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    template = os.path.join(root, "report", "template", "workbook.xlsx")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        logs_dir = fixture_dir or os.path.join(temp_dir, "logs")
+        stats_csv = os.path.join(logs_dir, f"before-source-wave-{config.wave}.csv")
+
+        result = {"orgs": config.orgs, "repos": config.orgs * config.repos}
+
+        if not os.path.exists(stats_csv):
+            start = time.perf_counter()
+            result.update(generate_report_fixture(config, logs_dir))
+            result["generate"] = time.perf_counter() - start
+
+        workbook_path = os.path.join(temp_dir, "workbook.xlsx")
+        shutil.copyfile(template, workbook_path)
+
+        mapping = org_mapping(config)
+        wave = config.wave
+
+        # The report reads the logs from a path relative to the working directory
+        relative_logs_dir = os.path.relpath(logs_dir)
+
+        # The report prints a line per repo
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with workbook_session(workbook_path) as workbook:
+                start = time.perf_counter()
+                org_timings, repo_timings, repo_results = generate_gei_reports(
+                    list(mapping.values()), relative_logs_dir
+                )
+                result["gei_reports"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                stats = generate_stats_report(workbook, wave, logs_dir, mapping)
+                result["stats_report"] = time.perf_counter() - start
+
+                # The sheets are saved as the session ends
+                start = time.perf_counter()
+                add_worksheet(workbook, f"Org Timings-{wave}", org_timings)
+                add_worksheet(workbook, f"Repo Timings-{wave}", repo_timings)
+                add_worksheet(workbook, f"Repo Results-{wave}", repo_results)
+                add_worksheet(workbook, f"Migration Report-{wave}", stats)
+            result["workbook_write"] = time.perf_counter() - start
+
+        result["warnings_and_errors"] = len(repo_results)
+        result["differences"] = len(stats)
+
+    return result
@@ -0,0 +1,69 @@
+import sys
+import time
+import statistics
+import subprocess
+
+###############################################################################
+# CLI startup
+#
+# Each measurement runs in a fresh interpreter, so nothing is already
+# imported or cached in memory.
+###############################################################################
+
+
+def import_time(module):
+    """Cumulative time to import `module`, in seconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines look like "import time:   self [us] | cumulative | module"
+    for line in reversed(result.stderr.splitlines()):
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1_000_000
+
+    raise ValueError(f"No import time reported for {module}")
+
+
+def run_time(args, repeat=5):
+    """Median wall time of `python -m migrate <args>`, in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "migrate", *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def measure_startup(commands, repeat=5):
+    """Import and `--help` times for the CLI and each of its commands"""
+    results = [
+        {
+            "command": "gh migrate",
+            "module": "migrate.__main__",
+            "import": import_time("migrate.__main__"),
+            "help": run_time(["--help"], repeat),
+        }
+    ]
+
+    for name, module in commands.items():
+        results.append(
+            {
+                "command": f"gh migrate {name}",
+                "module": module,
+                "import": import_time(module),
+                "help": run_time([name, "--help"], repeat),
+            }
+        )
+
+    return results
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from migrate.bench.fakegithub import serve
+
+###############################################################################
+# stats and snapshots throughput
+#
+# Each command runs in its own interpreter against a fake GitHub served from
+# this process, so its peak memory is its own. The server counts the requests
+# it answers.
+###############################################################################
+
+# Commands to benchmark, with the arguments they're run with
+COMMANDS = {
+    "stats": ["stats", "--before", "--source", "--wave", "0", "--no-cache"],
+    "snapshots": ["snapshots", "--before", "--source", "--wave", "0", "--no-cache"],
+}
+
+
+def run_command(args, cwd, env):
+    """Runs `python -m migrate <args>`, returns its wall time and peak RSS"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "migrate", "--no-metrics", *args],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    stderr = process.stderr.read()
+
+    # wait4 gives the resource usage of just this process
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"gh migrate {args[0]} failed:\n{stderr.decode(errors='replace')}"
+        )
+
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    return seconds, peak
+
+
+def measure_throughput(config, commands, concurrency=8, org_concurrency=1):
+    """Runs each command against a fake GitHub with `config`'s orgs"""
+    server = serve(config)
+    github = server.github
+
+    # Each command runs in its own temp directory, so `python -m migrate` has
+    # to be pointed at this tree
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    env = {
+        **os.environ,
+        "GH_MIGRATE_API_URL": server.url,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [root, os.environ.get("PYTHONPATH")])
+        ),
+    }
+
+    orgs = []
+    for org in github.org_names():
+        orgs += ["--org", org]
+
+    repos = config.orgs * config.repos
+    results = []
+
+    try:
+        for command in commands:
+            with tempfile.TemporaryDirectory() as output_dir:
+                args = [
+                    *COMMANDS[command],
+                    *orgs,
+                    "--pat",
+                    "bench-token",
+                    "--concurrency",
+                    str(concurrency),
+                    "--org-concurrency",
+                    str(org_concurrency),
+                ]
+                if command == "stats":
+                    args.append(output_dir)
+
+                # snapshots writes to ./snapshots, so both run in output_dir
+                before = github.requests
+                seconds, peak = run_command(args, output_dir, env)
+                requests = github.requests - before
+
+            results.append(
+                {
+                    "command": command,
+                    "orgs": config.orgs,
+                    "repos": repos,
+                    "seconds": seconds,
+                    "repos_per_second": repos / seconds,
+                    "requests": requests,
+                    "requests_per_repo": requests / repos,
+                    "peak_memory_mb": peak / 1024 / 1024,
+                }
+            )
+    finally:
+        server.shutdown()
+
+    return results
@@ -0,0 +1,231 @@
+import os
+import json
+import hashlib
+import threading
+
+import httpx
+import hishel
+
+###############################################################################
+# A disk-backed HTTP cache for the REST API
+#
+# GitHub sends an ETag and Last-Modified with every REST response. Cached
+# responses are always revalidated with If-None-Match / If-Modified-Since, so
+# stats never go stale, and an unchanged resource comes back as a 304 that
+# doesn't count against the primary rate limit.
+#
+# https://docs.github.com/en/rest/using-the-rest-api/best-practices-for-using-the-rest-api#use-conditional-requests-if-appropriate
+###############################################################################
+
+CACHE_DIR = ".cache/gh-migrate"
+
+# Maximum size of the cache, in MB
+CACHE_SIZE = 500
+
+# Once the cache is full, evict the least recently used responses until it
+# is back under this fraction of its maximum size
+EVICT_TO = 0.9
+
+
+def cache_key(request, body=b""):
+    """Like hishel's default key, but with one entry per token
+
+    Responses differ by token (e.g. what a PAT can see), and the token
+    itself is never written to disk, so only a hash of it goes in the key.
+    """
+    authorization = b"".join(
+        value for name, value in request.headers if name.lower() == b"authorization"
+    )
+    key = hashlib.blake2b(digest_size=16)
+    for part in (request.method, bytes(request.url), body, authorization):
+        key.update(part)
+        key.update(b"\0")
+    return key.hexdigest()
+
+
+class RedactingSerializer(hishel.JSONSerializer):
+    """Keeps tokens out of the cache files"""
+
+    def dumps(self, response, request, metadata):
+        data = json.loads(super().dumps(response, request, metadata))
+
+        data["request"]["headers"] = [
+            (key, value)
+            for key, value in data["request"]["headers"]
+            if key.lower() != "authorization"
+        ]
+
+        # The token is part of the cache key instead, so the stored request
+        # doesn't need to match on it
+        data["response"]["headers"] = [
+            (key, remove_from_vary(value) if key.lower() == "vary" else value)
+            for key, value in data["response"]["headers"]
+        ]
+
+        return json.dumps(data, indent=4)
+
+
+def remove_from_vary(value, header="authorization"):
+    return ", ".join(
+        field.strip()
+        for field in value.split(",")
+        if field.strip() and field.strip().lower() != header
+    )
+
+
+class HTTPCache:
+    """Size-bounded response cache shared by every client in the process"""
+
+    def __init__(self):
+        self.path = None
+        self.max_size = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def configure(self, path=CACHE_DIR, max_size=CACHE_SIZE):
+        """Turns the disk cache on, `max_size` is in MB"""
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_size = max_size * 1024 * 1024
+        self.size = sum(entry.stat().st_size for entry in self.entries())
+        self.evict()
+
+    def entries(self):
+        return [entry for entry in os.scandir(self.path) if entry.is_file()]
+
+    def controller(self):
+        return hishel.Controller(always_revalidate=True, key_generator=cache_key)
+
+    def transport(self, transport):
+        return CountingTransport(
+            hishel.CacheTransport(
+                transport,
+                storage=BoundedFileStorage(self),
+                controller=self.controller(),
+            ),
+            self,
+        )
+
+    def async_transport(self, transport):
+        return AsyncCountingTransport(
+            hishel.AsyncCacheTransport(
+                transport,
+                storage=AsyncBoundedFileStorage(self),
+                controller=self.controller(),
+            ),
+            self,
+        )
+
+    def stored(self, path, old_size):
+        """Accounts for a response written to `path`"""
+        with self.lock:
+            self.size += os.path.getsize(path) - old_size
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used responses once the cache is full"""
+        with self.lock:
+            if self.size <= self.max_size:
+                return
+
+            # Every hit rewrites its file, so mtime tracks the last use
+            for entry in sorted(self.entries(), key=lambda e: e.stat().st_mtime):
+                if self.size <= self.max_size * EVICT_TO:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self.size -= size
+                self.evictions += 1
+
+    def record(self, request, response):
+        if request.method != "GET":
+            return
+        with self.lock:
+            if response.extensions.get("from_cache"):
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def print_usage(self):
+        """Prints how well the cache did during this run"""
+        if not self.enabled or not (self.hits or self.misses):
+            return
+
+        hit_rate = self.hits / (self.hits + self.misses)
+        print("\n* HTTP cache usage")
+        print(
+            f"** {self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate), "
+            f"{self.evictions} evicted, {self.size / 1024 / 1024:.1f}/"
+            f"{self.max_size / 1024 / 1024:.0f} MB used"
+        )
+
+
+# Shared by every client in the process, off until configured
+http_cache = HTTPCache()
+
+
+class BoundedFileStorage(hishel.FileStorage):
+    def __init__(self, cache):
+        super().__init__(serializer=RedactingSerializer(), base_path=cache.path)
+        self.cache = cache
+
+    def store(self, key, response, request, metadata):
+        path = os.path.join(self.cache.path, key)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        super().store(key, response, request, metadata)
+        self.cache.stored(path, old_size)
+
+
+class AsyncBoundedFileStorage(hishel.AsyncFileStorage):
+    def __init__(self, cache):
+        super().__init__(serializer=RedactingSerializer(), base_path=cache.path)
+        self.cache = cache
+
+    async def store(self, key, response, request, metadata):
+        path = os.path.join(self.cache.path, key)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        await super().store(key, response, request, metadata)
+        self.cache.stored(path, old_size)
+
+
+class CountingTransport(httpx.BaseTransport):
+    """Counts cache hits and misses"""
+
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+
+    def handle_request(self, request):
+        response = self.transport.handle_request(request)
+        self.cache.record(request, response)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCountingTransport(httpx.AsyncBaseTransport):
+    """Counts cache hits and misses"""
+
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request):
+        response = await self.transport.handle_async_request(request)
+        self.cache.record(request, response)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
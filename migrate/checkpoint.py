@@ -0,0 +1,57 @@
+import os
+import json
+
+
+class Journal:
+    """Append-only record of the (org, repo) pairs a run has finished
+
+    Each line is a JSON object with `org`, `repo` and `status` ("done" or
+    "failed"). A repo is only marked done after its row has been written, so
+    a run can be resumed from the journal after a crash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+
+        with open(self.path, "r") as f:
+            for line in f:
+                # A crash can leave a half-written last line
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                key = (entry["org"], entry["repo"])
+                if entry["status"] == "done":
+                    self.done.add(key)
+                    self.failed.pop(key, None)
+                else:
+                    self.failed[key] = entry.get("error")
+
+        return self
+
+    def is_done(self, org, repo):
+        return (org, repo) in self.done
+
+    def mark_done(self, org, repo):
+        self.done.add((org, repo))
+        self.failed.pop((org, repo), None)
+        self._append({"org": org, "repo": repo, "status": "done"})
+
+    def mark_failed(self, org, repo, error):
+        self.failed[(org, repo)] = error
+        self._append({"org": org, "repo": repo, "status": "failed", "error": error})
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _append(self, entry):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
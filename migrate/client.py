@@ -0,0 +1,71 @@
+import os
+import httpx
+import hishel
+import githubkit
+
+from migrate.cache import http_cache
+from migrate.tokens import TokenPool, TokenPoolTransport, AsyncTokenPoolTransport
+from migrate.ratelimit import (
+    rate_limiter,
+    RateLimitTransport,
+    AsyncRateLimitTransport,
+    RetryWithBackoff,
+)
+
+# Overrides the API's base URL
+API_URL_ENV = "GH_MIGRATE_API_URL"
+
+
+class GitHub(githubkit.GitHub):
+    """A githubkit client whose requests are paced by the shared rate limiter
+
+    REST responses are cached on disk once `http_cache` has been configured.
+    With a `token_pool`, each request is sent with the pool's choice of token.
+    Requests go to GH_MIGRATE_API_URL instead of api.github.com if it's set,
+    e.g. to benchmark against migrate.bench.fakegithub.
+    """
+
+    def __init__(self, auth=None, token_pool=None, **kwargs):
+        kwargs.setdefault("auto_retry", RetryWithBackoff())
+        if os.environ.get(API_URL_ENV):
+            kwargs.setdefault("base_url", os.environ[API_URL_ENV])
+        super().__init__(auth, **kwargs)
+        self.token_pool = token_pool
+
+    @classmethod
+    def from_tokens(cls, tokens, **kwargs):
+        """A client for one token, or for a pool of several"""
+        tokens = list(dict.fromkeys(tokens))
+        if len(tokens) > 1:
+            kwargs["token_pool"] = TokenPool(tokens)
+        return cls(tokens[0] if tokens else None, **kwargs)
+
+    def _create_sync_client(self):
+        transport = RateLimitTransport(httpx.HTTPTransport(), rate_limiter)
+        if self.config.http_cache and http_cache.enabled:
+            transport = http_cache.transport(transport)
+        elif self.config.http_cache:
+            transport = hishel.CacheTransport(
+                transport, storage=hishel.InMemoryStorage()
+            )
+
+        # Outside the cache, which keeps each token's responses apart
+        if self.token_pool is not None:
+            transport = TokenPoolTransport(transport, self.token_pool)
+
+        return httpx.Client(**self._get_client_defaults(), transport=transport)
+
+    def _create_async_client(self):
+        transport = AsyncRateLimitTransport(httpx.AsyncHTTPTransport(), rate_limiter)
+        if self.config.http_cache and http_cache.enabled:
+            transport = http_cache.async_transport(transport)
+        elif self.config.http_cache:
+            transport = hishel.AsyncCacheTransport(
+                transport, storage=hishel.AsyncInMemoryStorage()
+            )
+
+        # Outside the cache, which keeps each token's responses apart
+        if self.token_pool is not None:
+            transport = AsyncTokenPoolTransport(transport, self.token_pool)
+
+        return httpx.AsyncClient(**self._get_client_defaults(), transport=transport)
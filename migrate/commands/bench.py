@@ -0,0 +1,281 @@
+import json
+import click
+
+from migrate.bench.startup import measure_startup
+
+
+@click.group()
+def bench():
+    pass
+
+
+##############################################################################
+# CLI startup
+##############################################################################
+@bench.command()
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Number of runs to take the median of",
+)
+@click.option(
+    "--output",
+    "output_path",
+    type=click.Path(dir_okay=False),
+    help="Also write the results to a JSON file",
+)
+def startup(repeat, output_path):
+    """Import and --help times for each command"""
+    from migrate.__main__ import cli
+
+    commands = {
+        name: import_path.rsplit(".", 1)[0]
+        for name, (import_path, _) in cli.lazy_subcommands.items()
+    }
+
+    print(f"* Measuring startup, median of {repeat} runs")
+    results = measure_startup(commands, repeat)
+
+    for result in results:
+        print(
+            f"** {result['command']}: import {result['import']:.3f}s, "
+            f"--help {result['help']:.3f}s"
+        )
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+##############################################################################
+# stats and snapshots throughput
+##############################################################################
+@bench.command()
+@click.option("--orgs", type=click.IntRange(min=1), default=2, show_default=True)
+@click.option(
+    "--repos",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Repos per org",
+)
+@click.option(
+    "--max-issues",
+    type=click.IntRange(min=0),
+    default=50,
+    show_default=True,
+    help="Most issues a repo can have, ditto for PRs",
+)
+@click.option(
+    "--latency",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="Seconds added to every response",
+)
+@click.option(
+    "--rate-limit",
+    type=click.IntRange(min=1),
+    default=5000,
+    show_default=True,
+    help="Requests each token can make per window",
+)
+@click.option(
+    "--window",
+    type=click.FloatRange(min=1),
+    default=3600.0,
+    show_default=True,
+    help="Seconds until a token's rate limit resets",
+)
+@click.option(
+    "--command",
+    "commands",
+    type=click.Choice(["stats", "snapshots"]),
+    multiple=True,
+    default=["stats", "snapshots"],
+    show_default=True,
+)
+@click.option("--concurrency", type=click.IntRange(min=1), default=8, show_default=True)
+@click.option(
+    "--org-concurrency", type=click.IntRange(min=1), default=1, show_default=True
+)
+@click.option(
+    "--output",
+    "output_path",
+    type=click.Path(dir_okay=False),
+    help="Also write the results to a JSON file",
+)
+def throughput(
+    orgs,
+    repos,
+    max_issues,
+    latency,
+    rate_limit,
+    window,
+    commands,
+    concurrency,
+    org_concurrency,
+    output_path,
+):
+    """stats and snapshots against a local fake GitHub"""
+    from migrate.bench.throughput import measure_throughput
+    from migrate.bench.fakegithub import FakeGitHubConfig
+
+    config = FakeGitHubConfig(
+        orgs=orgs,
+        repos=repos,
+        max_issues=max_issues,
+        max_pulls=max_issues,
+        latency=latency,
+        rate_limit=rate_limit,
+        window=window,
+    )
+
+    print(f"* Measuring {', '.join(commands)} on {orgs} orgs of {repos} repos")
+    results = measure_throughput(config, commands, concurrency, org_concurrency)
+
+    for result in results:
+        print(
+            f"** {result['command']}: {result['seconds']:.2f}s, "
+            f"{result['repos_per_second']:.1f} repos/s, "
+            f"{result['requests_per_repo']:.1f} requests/repo, "
+            f"peak memory {result['peak_memory_mb']:.0f} MB"
+        )
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+##############################################################################
+# report on a synthetic wave
+##############################################################################
+@bench.command()
+@click.option("--orgs", type=click.IntRange(min=1), default=2, show_default=True)
+@click.option(
+    "--repos",
+    type=click.IntRange(min=1),
+    default=500,
+    show_default=True,
+    help="Repos per org",
+)
+@click.option(
+    "--failure-rate",
+    type=click.FloatRange(min=0, max=1),
+    default=0.02,
+    show_default=True,
+    help="Share of repos whose migration failed",
+)
+@click.option(
+    "--warning-rate",
+    type=click.FloatRange(min=0, max=1),
+    default=0.05,
+    show_default=True,
+    help="Chance of a warning at each step of a repo's migration",
+)
+@click.option(
+    "--drift-rate",
+    type=click.FloatRange(min=0, max=1),
+    default=0.05,
+    show_default=True,
+    help="Share of migrated repos whose target stats differ",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--fixture-dir",
+    type=click.Path(file_okay=False),
+    help="Keep the generated logs and stats here, and reuse them if they exist",
+)
+@click.option(
+    "--output",
+    "output_path",
+    type=click.Path(dir_okay=False),
+    help="Also write the results to a JSON file",
+)
+def report(
+    orgs,
+    repos,
+    failure_rate,
+    warning_rate,
+    drift_rate,
+    seed,
+    fixture_dir,
+    output_path,
+):
+    """report's stages on a synthetic wave of GEI logs and stats"""
+    from migrate.bench.report import measure_report
+    from migrate.bench.fixtures import ReportFixtureConfig
+
+    config = ReportFixtureConfig(
+        orgs=orgs,
+        repos=repos,
+        failure_rate=failure_rate,
+        warning_rate=warning_rate,
+        drift_rate=drift_rate,
+        seed=seed,
+    )
+
+    print(f"* Measuring report on {orgs} orgs of {repos} repos")
+    result = measure_report(config, fixture_dir)
+
+    if "generate" in result:
+        print(
+            f"** Generated {result['repos']} repos in {result['generate']:.2f}s, "
+            f"{result['failed']} failed, {result['drifted']} drifted"
+        )
+    print(
+        f"** GEI reports: {result['gei_reports']:.2f}s, "
+        f"{result['warnings_and_errors']} warnings and errors"
+    )
+    print(
+        f"** Stats report: {result['stats_report']:.2f}s, "
+        f"{result['differences']} differences"
+    )
+    print(f"** Workbook write: {result['workbook_write']:.2f}s")
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(result, f, indent=4)
+
+
+##############################################################################
+# Memory held by a loaded inventory
+##############################################################################
+@bench.command()
+@click.option("--orgs", type=click.IntRange(min=1), default=10, show_default=True)
+@click.option(
+    "--repos",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="Repos per org",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--output",
+    "output_path",
+    type=click.Path(dir_okay=False),
+    help="Also write the results to a JSON file",
+)
+def memory(orgs, repos, seed, output_path):
+    """Memory a wave's stats take up, with and without the stats schema"""
+    from migrate.bench.memory import measure_memory
+    from migrate.bench.fixtures import ReportFixtureConfig
+
+    config = ReportFixtureConfig(orgs=orgs, repos=repos, seed=seed)
+
+    print(f"* Measuring the stats of {orgs} orgs of {repos} repos in memory")
+    results = measure_memory(config)
+
+    for result in results:
+        print(
+            f"** {result['loader']}: {result['memory_mb']:.1f} MB, "
+            f"loaded in {result['seconds']:.2f}s, "
+            f"{result['vs_strings']:.1f}x smaller than all strings"
+        )
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,29 @@
+import click
+import pandas as pd
+
+from migrate.statsfile import as_strings
+from migrate.tables import FORMATS, with_format
+
+
+@click.command()
+@click.argument(
+    "paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False)
+)
+def export(paths):
+    """Write a CSV copy of each Parquet stats file or snapshot
+
+    The CSV is then the newer file, so commands reading the stats or snapshot
+    will pick it over the Parquet file.
+    """
+    for path in paths:
+        if not path.endswith(FORMATS["parquet"]):
+            raise click.BadParameter(
+                f"{path} is not a Parquet file", param_hint="PATHS"
+            )
+
+        csv_path = with_format(path, "csv")
+
+        # The same values the command would have written to a CSV
+        as_strings(pd.read_parquet(path)).to_csv(csv_path, index=False)
+
+        print(f"* Exported {path} to {csv_path}")
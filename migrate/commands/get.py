@@ -3,11 +3,15 @@ import pandas as pd
 
 import os
 from functools import lru_cache
-from githubkit import GitHub
+from migrate.client import GitHub
 
+import httpx
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from migrate.metrics import metrics
+from migrate.queries import get_query
 from migrate.workbook import get_included_orgs_by_wave
 
 ###############################################################################
@@ -23,8 +27,18 @@ from migrate.workbook import get_included_orgs_by_wave
 #
 # The problem with retrieving logs from the issue comment is that if issues are
 # not enabled in the repo, GEI will not be able to post the logs.
+#
+# Logs are retrieved incrementally, so `get logs` can be re-run as more repos
+# finish: an existing clone of 'gei-migration-results' is updated with a
+# shallow fetch, and logs already downloaded from the migration API are kept.
 ###############################################################################
 
+# Repo logs downloaded from the migration API at once, per org
+DOWNLOAD_CONCURRENCY = 8
+
+# Where each migration state's logs go, as in 'gei-migration-results'
+STATE_DIRS = {"SUCCEEDED": "success", "FAILED": "failure"}
+
 
 @click.group()
 def get():
@@ -44,7 +58,24 @@ def get():
 )
 @click.option("--dry-run", is_flag=True, help="Is this a dry-run?")
 @click.option("-o", "--output", "output", required=True, default="logs")
-def logs(orgs, pat, wave, workbook_path, dry_run, output):
+@click.option(
+    "--org-concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of orgs to retrieve logs for at once",
+)
+@click.option(
+    "--from",
+    "source",
+    type=click.Choice(["results-repo", "migration-api"]),
+    default="results-repo",
+    show_default=True,
+    help="Clone 'gei-migration-results' (migrate-org), or download the "
+    "logs of migrations less than a day old (migrate-repo)",
+)
+@metrics.command("get-logs")
+def logs(orgs, pat, wave, workbook_path, dry_run, output, org_concurrency, source):
     print(f"* Checking {orgs}")
 
     if dry_run:
@@ -61,30 +92,133 @@ def logs(orgs, pat, wave, workbook_path, dry_run, output):
         orgs = get_included_orgs_by_wave("dry_run_target_name", wave, workbook_path)
 
     if orgs is not None:
-        for org in orgs:
+        github = GitHub(pat)
+
+        def get_log(org):
             print(f"\n* Processing org {org}")
-            github = GitHub(pat)
-            get_org_log(github, "target", org, output)
+            if source == "migration-api":
+                get_org_migration_logs(github, org, output)
+            else:
+                get_org_log(github, "target", org, output)
+
+        # The work is in `gh`/`git` processes and downloads, so threads will do
+        with ThreadPoolExecutor(max_workers=org_concurrency) as executor:
+            list(executor.map(get_log, orgs))
 
 
 def get_org_log(github: GitHub, source, org, output_dir):
-    """Process all repos in an org"""
+    """Clones or updates an org's 'gei-migration-results' repo"""
 
     output_dir = f"{output_dir}/{org}"
 
-    # Define the command
-    command = [
-        "gh",
-        "repo",
-        "clone",
-        f"https://github.com/{org}/gei-migration-results",
-        output_dir,
-    ]
+    # Only the latest commit is needed, so clone and update shallowly
+    if os.path.exists(os.path.join(output_dir, ".git")):
+        commands = [
+            ["git", "-C", output_dir, "fetch", "--depth", "1", "origin", "HEAD"],
+            ["git", "-C", output_dir, "reset", "--hard", "FETCH_HEAD"],
+        ]
+    else:
+        commands = [
+            [
+                "gh",
+                "repo",
+                "clone",
+                f"https://github.com/{org}/gei-migration-results",
+                output_dir,
+                "--",
+                "--depth",
+                "1",
+            ]
+        ]
+
+    # Run the commands
+    for command in commands:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            print(
+                f"Failed to retrieve migration logs for {org}: "
+                f'{result.stderr.decode("utf-8")}'
+            )
+            return
+
+    print(f"Retrieved migration logs for {org} successfully!")
+
+
+def get_org_migration_logs(github: GitHub, org, output_dir):
+    """Downloads the logs of an org's repo migrations from the migration API
+
+    GitHub only keeps a migration's `migrationLogUrl` for 24 hours. Repos
+    whose log has already been downloaded are skipped.
+    """
 
-    # Run the command
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output_dir = f"{output_dir}/{org}"
 
-    if result.returncode == 0:
-        print("Retrieved migration logs successfully!")
-    else:
-        print(f'Failed to retrieve migration logs: {result.stderr.decode("utf-8")}')
+    # The client is per thread, each org is retrieved in its own
+    with github:
+        migrations = list(get_repo_migrations(github, org))
+
+    downloads = []
+    no_log = 0
+    for migration in migrations:
+        state_dir = STATE_DIRS.get(migration["state"])
+
+        # Still queued or in progress
+        if state_dir is None:
+            continue
+
+        path = os.path.join(output_dir, state_dir, f'{migration["repositoryName"]}.txt')
+        if os.path.exists(path):
+            continue
+
+        if migration["migrationLogUrl"] is None:
+            print(f'** No migration log for {migration["repositoryName"]}')
+            no_log += 1
+            continue
+
+        downloads.append((migration["migrationLogUrl"], path))
+
+    # The log URLs are pre-signed, so they're fetched without the token
+    with httpx.Client(follow_redirects=True) as client:
+
+        def download(url, path):
+            """Returns whether the log was downloaded"""
+            try:
+                response = client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                # e.g. the URL expired, carry on with the other logs
+                print(
+                    f"Failed to retrieve migration log {path}: {str(e).splitlines()[0]}"
+                )
+                return False
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(response.content)
+            return True
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as executor:
+            retrieved = sum(executor.map(lambda d: download(*d), downloads))
+
+    failed = len(downloads) - retrieved
+    skipped = len(migrations) - len(downloads) - no_log
+    print(
+        f"Retrieved {retrieved} new migration logs for {org}, {failed} failed, "
+        f"{no_log} without a log, {skipped} already retrieved or unfinished"
+    )
+
+
+def get_repo_migrations(github: GitHub, org):
+    """Yields each of the org's repo migrations"""
+    query = get_query("org-migrations")
+    variables = {"login": org, "pageSize": 100, "endCursor": None}
+
+    while True:
+        data = github.graphql(query, variables)
+        migrations = data["organization"]["repositoryMigrations"]
+
+        yield from migrations["nodes"]
+
+        if not migrations["pageInfo"]["hasNextPage"]:
+            break
+        variables["endCursor"] = migrations["pageInfo"]["endCursor"]
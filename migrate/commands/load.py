@@ -2,6 +2,9 @@ import os
 import click
 import pandas as pd
 
+from migrate.metrics import metrics
+from migrate.statsfile import read_stats
+from migrate.tables import find_table
 from migrate.version import checkpoint_file, snapshot_before_after
 
 from ..workbook import *
@@ -23,30 +26,25 @@ def load():
     default="./report/InfoMagnus - Migration Workbook.xlsx",
 )
 # @snapshot_before_after()
+@metrics.command("load-inventory")
 def inventory(before_source, before_target, workbook_path):
     "" ""
 
-    workbook = get_workbook(workbook_path)
+    # Every sheet is saved at once, when the session ends
+    with workbook_session(workbook_path) as workbook:
+        source_stats = read_stats(before_source)
+        print(f"*** Loading inventory")
+        add_inventory_worksheet(workbook, "Inventory - Source Repos", source_stats)
 
-    source_stats = pd.read_csv(
-        before_source,
-        parse_dates=["updatedAt", "pushedAt"],
-    )
-    print(f"*** Loading inventory")
-    add_inventory_worksheet(workbook, "Inventory - Source Repos", source_stats)
+        # If before_file exists
+        if os.path.exists(find_table(before_target)):
+            target_stats = read_stats(before_target)
 
-    # If before_file exists
-    if os.path.exists(before_target):
-        target_stats = pd.read_csv(
-            before_target,
-            parse_dates=["updatedAt", "pushedAt"],
-        )
+            add_inventory_worksheet(workbook, "Inventory - Target Repos", target_stats)
 
-        add_inventory_worksheet(workbook, "Inventory - Target Repos", target_stats)
-
-    print(f"*** Generating pre-migration report")
-    add_pre_migration_report(workbook, "Pre-migration Report", source_stats)
-    print(f"*** Adding org mapping")
-    add_org_mapping(workbook, "Mapping - Org", source_stats)
+        print(f"*** Generating pre-migration report")
+        add_pre_migration_report(workbook, "Pre-migration Report", source_stats)
+        print(f"*** Adding org mapping")
+        add_org_mapping(workbook, "Mapping - Org", source_stats)
 
     print(f"*** Migration workbook updated")
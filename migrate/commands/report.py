@@ -2,8 +2,16 @@ import os
 import click
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
 from migrate.workbook import *
+from migrate.logparser import parse_repo_log, TIMESTAMP_FORMAT
+from migrate.metrics import metrics
+from migrate.statsfile import read_stats
+
+# Repo logs are only parsed in worker processes when there are at least this
+# many in a directory
+POOL_MIN_LOGS = 64
 
 
 @click.command()
@@ -17,10 +25,9 @@ from migrate.workbook import *
     default="report/InfoMagnus - Migration Workbook.xlsx",
 )
 @click.argument("output_dir", type=click.STRING, required=False, default="logs")
+@metrics.command("report")
 def report(dry_run, wave, workbook_path, output_dir):
 
-    workbook = get_workbook(workbook_path)
-
     target_column = "target_name"
 
     if dry_run:
@@ -29,49 +36,54 @@ def report(dry_run, wave, workbook_path, output_dir):
 
     orgs = get_included_orgs_by_wave(target_column, wave, workbook_path)
 
-    ############################################################
-    # Parse the GEI logs and generate the GEI migration reports
-    ############################################################
-    print(f"\n* Generating GEI migration reports for wave: {wave}")
-    (org_timings, repo_timings, repo_results) = generate_gei_reports(orgs, output_dir)
-    add_worksheet(workbook, f"Org Timings-{wave}", org_timings)
-    add_worksheet(workbook, f"Repo Timings-{wave}", repo_timings)
-    add_worksheet(workbook, f"Repo Results-{wave}", repo_results)
-    workbook.save(workbook_path)
-
-    ############################################################
-    # Parse the `gh migrate stats` results and report any
-    # differences between the source and target orgs
-    ############################################################
-    print(f"\n* Generating stats report for wave: {wave}")
-    stats = generate_stats_report(workbook, wave, output_dir)
-    add_worksheet(workbook, f"Migration Report-{wave}", stats)
+    # Both reports' sheets are saved at once, when the session ends
+    with workbook_session(workbook_path) as workbook:
+        ############################################################
+        # Parse the GEI logs and generate the GEI migration reports
+        ############################################################
+        print(f"\n* Generating GEI migration reports for wave: {wave}")
+        (org_timings, repo_timings, repo_results) = generate_gei_reports(
+            orgs, output_dir
+        )
+        add_worksheet(workbook, f"Org Timings-{wave}", org_timings)
+        add_worksheet(workbook, f"Repo Timings-{wave}", repo_timings)
+        add_worksheet(workbook, f"Repo Results-{wave}", repo_results)
 
-    workbook.save(workbook_path)
+        ############################################################
+        # Parse the `gh migrate stats` results and report any
+        # differences between the source and target orgs
+        ############################################################
+        print(f"\n* Generating stats report for wave: {wave}")
+        org_mapping = get_mapping_index(workbook_path).org_mapping(target_column, wave)
+        stats = generate_stats_report(workbook, wave, output_dir, org_mapping)
+        add_worksheet(workbook, f"Migration Report-{wave}", stats)
 
 
+@metrics.timed("report.gei_logs")
 def generate_gei_reports(orgs, logs_dir):
 
     org_timings = []
     repo_timings = []
     repo_results = []
 
-    for org in orgs:
-        print(f"\n** Processing org {org}")
-        (start_time, end_time, duration, repo_timing, repo_result) = (
-            parse_migration_logs(org, logs_dir)
-        )
-
-        org_timings.append(
-            {
-                "org": org,
-                "start_time": start_time,
-                "end_time": end_time,
-                "duration (mins)": duration,
-            }
-        )
-        repo_timings.append(repo_timing)
-        repo_results.append(repo_result)
+    # Shared by every org, the pool only starts once it's first used
+    with ProcessPoolExecutor() as executor:
+        for org in orgs:
+            print(f"\n** Processing org {org}")
+            (start_time, end_time, duration, repo_timing, repo_result) = (
+                parse_migration_logs(org, logs_dir, executor)
+            )
+
+            org_timings.append(
+                {
+                    "org": org,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "duration (mins)": duration,
+                }
+            )
+            repo_timings.append(repo_timing)
+            repo_results.append(repo_result)
 
     org_timings_df = pd.DataFrame(org_timings)
     repo_timings_df = pd.concat(repo_timings)
@@ -80,7 +92,7 @@ def generate_gei_reports(orgs, logs_dir):
     return (org_timings_df, repo_timings_df, repo_results_df)
 
 
-def parse_migration_logs(org, output_dir):
+def parse_migration_logs(org, output_dir, executor=None):
     output_dir = f"{output_dir}/{org}"
 
     # Parse the organization migration log
@@ -88,10 +100,10 @@ def parse_migration_logs(org, output_dir):
 
     # Parse the repository migration logs
     (success_repo_timing, success_repo_results) = parse_repo_logs(
-        org, "success", f"./{output_dir}"
+        org, "success", f"./{output_dir}", executor
     )
     (fail_repo_timing, fail_repo_results) = parse_repo_logs(
-        org, "failure", f"./{output_dir}"
+        org, "failure", f"./{output_dir}", executor
     )
 
     repo_timing = pd.concat([success_repo_timing, fail_repo_timing])
@@ -104,6 +116,11 @@ def parse_org_log(output_dir):
 
     org_log = os.path.join("./", output_dir, "README.md")
 
+    # Logs downloaded from the migration API don't have an org log
+    if not os.path.exists(org_log):
+        print(f"*** No org migration log at {org_log}")
+        return (None, None, None)
+
     # Open file and find lines starting with '['
     with open(org_log, "r") as f:
         lines = [line for line in f.readlines() if line.startswith("[")]
@@ -128,95 +145,79 @@ def parse_org_log(output_dir):
     return (start_time, end_time, int((end_time - start_time).total_seconds() / 60))
 
 
-def parse_repo_logs(org, type, output_dir):
+def parse_repo_logs(org, type, output_dir, executor=None):
 
-    timing = []
     results = []
 
     output_dir = f"{output_dir}/{type}"
 
     # Return if output_dir doesn't exist
     if not os.path.exists(output_dir):
-        return pd.DataFrame(timing), pd.DataFrame(results)
+        return pd.DataFrame([]), pd.DataFrame(results)
 
     # Get all the directories in the output_dir
     repos = [repo for repo in os.listdir(output_dir)]
+    paths = [f"{output_dir}/{repo_log}" for repo_log in repos]
+
+    # Parse the logs in the worker processes, unless there are only a few
+    if executor is None or len(repos) < POOL_MIN_LOGS:
+        logs = [parse_repo_log(path, type) for path in paths]
+    else:
+        chunksize = max(1, len(repos) // ((os.cpu_count() or 1) * 4))
+        logs = list(
+            executor.map(
+                parse_repo_log, paths, [type] * len(paths), chunksize=chunksize
+            )
+        )
 
-    for repo_log in repos:
-        # Open file and find lines starting with '['
-        with open(f"{output_dir}/{repo_log}", "r") as f:
-            lines = [line for line in f.readlines() if line.startswith("[")]
-
-        ############################################################
-        # Get repo migration timing
-        ############################################################
-
-        # We should *always* have a start line
-        start_line = [line for line in lines if "Migration started" in line]
-        assert len(start_line) == 1
-        start_line = start_line[0]
-
-        if type == "success":
-            end_line = [line for line in lines if "Migration complete" in line][0]
-        elif type == "failure":
-            end_line = [line for line in lines if "Migration failed" in line][0]
-
-        # Parse start time from start_line
-        start_time = start_line.split(" ")[0]
-        end_time = end_line.split(" ")[0]
-
-        # Remove '[' and ']'
-        start_time = start_time[1:-1]
-        end_time = end_time[1:-1]
+    if not logs:
+        return pd.DataFrame([]), pd.DataFrame(results)
 
-        # start_time contains a string like "2024-04-12T01:25:50Z"
+    ############################################################
+    # Get repo migration timing
+    ############################################################
 
-        start_time = datetime.datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ")
-        end_time = datetime.datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%SZ")
+    # Timestamps look like "2024-04-12T01:25:50Z", parse them all at once
+    start_times = pd.to_datetime([log[0] for log in logs], format=TIMESTAMP_FORMAT)
+    end_times = pd.to_datetime([log[1] for log in logs], format=TIMESTAMP_FORMAT)
+
+    timing_df = pd.DataFrame(
+        {
+            "org": org,
+            "repo": repos,
+            "start_time": start_times,
+            "end_time": end_times,
+            "duration (mins)": ((end_times - start_times).total_seconds() / 60).astype(
+                int
+            ),
+        }
+    )
 
+    ############################################################
+    # Get warnings or errors
+    ############################################################
+    for repo_log, (_, _, warnings, errors) in zip(repos, logs):
         print(f"Repo: {repo_log}")
 
-        timing.append(
-            {
-                "org": org,
-                "repo": repo_log,
-                "start_time": start_time,
-                "end_time": end_time,
-                "duration (mins)": int((end_time - start_time).total_seconds() / 60),
-            }
-        )
-
-        ############################################################
-        # Get warnings or errors
-        ############################################################
-
-        warnings = [line for line in lines if "WARN" in line]
-        errors = [line for line in lines if "ERROR" in line]
-
-        if len(warnings) != 0:
-            for warning in warnings:
-                results.append(
-                    {
-                        "org": org,
-                        "repo": repo_log,
-                        "type": "WARN",
-                        "message": warning.strip(),
-                    }
-                )
-
-        if len(errors) != 0:
-            for error in errors:
-                results.append(
-                    {
-                        "org": org,
-                        "repo": repo_log,
-                        "type": "ERROR",
-                        "message": error.strip(),
-                    }
-                )
-
-    # Write timing_results to csv
-    timing_df = pd.DataFrame(timing)
+        for warning in warnings:
+            results.append(
+                {
+                    "org": org,
+                    "repo": repo_log,
+                    "type": "WARN",
+                    "message": warning,
+                }
+            )
+
+        for error in errors:
+            results.append(
+                {
+                    "org": org,
+                    "repo": repo_log,
+                    "type": "ERROR",
+                    "message": error,
+                }
+            )
 
     # Write results to csv
     results_df = pd.DataFrame(results)
@@ -224,15 +225,17 @@ def parse_repo_logs(org, type, output_dir):
     return (timing_df, results_df)
 
 
-def generate_stats_report(workbook, wave, output):
+@metrics.timed("report.stats")
+def generate_stats_report(workbook, wave, output, org_mapping=None):
 
     before_source = os.path.join(output, f"before-source-wave-{wave}.csv")
     after_target = os.path.join(output, f"after-target-wave-{wave}.csv")
     after_source = os.path.join(output, f"after-source-wave-{wave}.csv")
 
-    before_source_stats = pd.read_csv(before_source, dtype=str)
-    after_target_stats = pd.read_csv(after_target, dtype=str)
-    after_source_stats = pd.read_csv(after_source, dtype=str)
+    # Saved as CSV or Parquet, read with typed columns
+    before_source_stats = read_stats(before_source)
+    after_target_stats = read_stats(after_target)
+    after_source_stats = read_stats(after_source)
 
     ignore_cols = [
         "createdAt",
@@ -247,58 +250,106 @@ def generate_stats_report(workbook, wave, output):
     after_source_stats = after_source_stats.drop(columns=ignore_cols)
 
     return compare_dfs(
-        "name", before_source_stats, after_target_stats, after_source_stats, output
+        "name",
+        before_source_stats,
+        after_target_stats,
+        after_source_stats,
+        output,
+        org_mapping,
     )
 
 
-def compare_dfs(key, source_df, target_df, context_df, output):
+def compare_dfs(key, source_df, target_df, context_df, output, org_mapping=None):
     """
     Compare the before_source and after_target dataframes and write the differences to file
+
+    Rows are matched on (owner.login, `key`), with the source orgs renamed to
+    their target orgs through `org_mapping`. Without a mapping, rows are
+    matched on `key` alone. Strings are compared case-insensitively, and two
+    missing values are equal.
     """
 
-    def not_equal(val1, val2):
-        val1 = val1.lower() if isinstance(val1, str) else val1
-        val2 = val2.lower() if isinstance(val2, str) else val2
-
-        if pd.isna(val1) and pd.isna(val2):
-            return False
-        if pd.isna(val1) or pd.isna(val2):
-            return True
-        elif val1 != val2:
-            return True
-        else:
-            return False
-
-    def get_row(key, df, name):
-        return df[df[key] == name]
-
-    diffs = []
-
-    for row in source_df.itertuples():
-        source_row = get_row(key, source_df, row.name)
-        target_row = get_row(key, target_df, row.name)
-        context_row = get_row(key, context_df, row.name)
-
-        if source_row.equals(target_row):
-            continue
-        elif source_row.empty or target_row.empty:
-            continue
-        else:
-            for col in source_row.columns:
-                if not_equal(source_row[col].values[0], target_row[col].values[0]):
-                    diffs.append(
-                        {
-                            "source_name": f"{source_row['owner.login'].values[0]}/{source_row['name'].values[0]}",
-                            "target_name": f"{target_row['owner.login'].values[0]}/{target_row['name'].values[0]}",
-                            "column": col,
-                            "source_value": source_row[col].values[0],
-                            "target_value": target_row[col].values[0],
-                            "context_value": context_row[col].values[0],
-                            "source_date": source_row["Inventoried"].values[0],
-                            "target_date": target_row["Inventoried"].values[0],
-                            "context_date": context_row["Inventoried"].values[0],
-                        }
-                    )
+    def lower(column):
+        # Categories differ from file to file, compare their values
+        if column.dtype == "category":
+            column = column.astype(object)
+        return column.str.lower() if column.dtype == object else column
+
+    def join_key(df, orgs=None):
+        orgs = orgs or {}
+        names = lower(df[key].astype(str))
+        if org_mapping is None:
+            return names
+
+        owners = lower(df["owner.login"].astype(str))
+        owners = owners.map(lambda owner: orgs.get(owner, owner))
+        return owners + "/" + names
+
+    def align(df, source_key):
+        """Lines df up with the source rows, the first match wins"""
+        df_key = join_key(df)
+        df = df[~df_key.duplicated()].set_axis(df_key[~df_key.duplicated()])
+        return df.reindex(index=source_key, columns=columns).set_axis(source_df.index)
+
+    if org_mapping is not None:
+        org_mapping = {
+            str(source).lower(): str(target).lower()
+            for source, target in org_mapping.items()
+        }
+
+    columns = list(source_df.columns)
+    source_df = source_df.reset_index(drop=True)
+
+    # The target stats are in the renamed orgs, the after-source stats are
+    # still in the source orgs
+    target_key = join_key(source_df, org_mapping)
+    context_key = join_key(source_df)
+
+    # Skip repos that weren't found in the target
+    found = target_key.isin(join_key(target_df))
+
+    target_df = align(target_df, target_key)
+    context_df = align(context_df, context_key)
+
+    # Compare every column at once
+    source_values = source_df.apply(lower)
+    target_values = target_df.apply(lower)
+    # Typed columns compare as missing if either side is, count that as a
+    # difference unless both are
+    different = (source_values != target_values).fillna(True) & ~(
+        source_values.isna() & target_values.isna()
+    )
+    different = different.to_numpy(dtype=bool) & found.to_numpy()[:, None]
+
+    # Row-major, so the diffs come out repo by repo as before
+    rows, cols = different.nonzero()
+
+    def values(df):
+        """Missing values as None, which the workbook can write"""
+        return df.astype(object).where(df.notna(), None).to_numpy()
+
+    source = values(source_df)
+    target = values(target_df)
+    context = values(context_df)
+    inventoried = columns.index("Inventoried")
+
+    def names(values):
+        owner, name = columns.index("owner.login"), columns.index("name")
+        return [f"{row[owner]}/{row[name]}" for row in values[rows]]
+
+    diffs = pd.DataFrame(
+        {
+            "source_name": names(source),
+            "target_name": names(target),
+            "column": [columns[col] for col in cols],
+            "source_value": source[rows, cols],
+            "target_value": target[rows, cols],
+            "context_value": context[rows, cols],
+            "source_date": source[rows, inventoried],
+            "target_date": target[rows, inventoried],
+            "context_date": context[rows, inventoried],
+        }
+    )
 
     # Write the differences to a file
-    return pd.DataFrame(diffs)
+    return diffs
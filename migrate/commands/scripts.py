@@ -5,6 +5,9 @@ from jinja2 import Environment, FileSystemLoader
 import pandas as pd
 
 from ..workbook import *
+from migrate.metrics import metrics
+from migrate.statsfile import read_stats
+from migrate.tables import load_table
 from migrate.version import checkpoint_file
 
 
@@ -13,6 +16,7 @@ def scripts():
     pass
 
 
+@metrics.timed("scripts.render")
 def render_template(template_name, output_name, **kwargs):
     """
     Render a jinja2 template and write it to a file.
@@ -47,6 +51,7 @@ def render_template(template_name, output_name, **kwargs):
 )
 @click.option("--dry-run", is_flag=True, help="Is this a dry-run?")
 @click.option("--wave", type=int, help="Wave number", required=True)
+@metrics.command("scripts-migration")
 def migration(workbook_path, dry_run, wave):
     """
     Generate the migration script.
@@ -76,7 +81,7 @@ def migration(workbook_path, dry_run, wave):
     ###############################
     # Archive repos in orgs
     ###############################
-    before_source_stats = pd.read_csv(f"./logs/before-source-wave-{int(wave)}.csv")
+    before_source_stats = read_stats(f"./logs/before-source-wave-{int(wave)}.csv")
     before_source_stats = before_source_stats[["name", "owner.login"]]
 
     render_template(
@@ -111,6 +116,7 @@ def migration(workbook_path, dry_run, wave):
 )
 @click.option("--dry-run", is_flag=True, help="Is this a dry-run?")
 @click.option("--wave", type=int, help="Wave number", required=True)
+@metrics.command("scripts-post-migration")
 def post_migration(workbook_path, dry_run, wave):
     print("*** Generating post-migration scripts")
 
@@ -141,7 +147,7 @@ def post_migration(workbook_path, dry_run, wave):
             "snapshots", "before", "source", source_org, "team-repos.csv"
         )
 
-        team_repos_df = pd.read_csv(team_repos_dir)
+        team_repos_df = load_table(team_repos_dir)
 
         output_file = f"{prefix}-wave-{int(wave)}-update-team-perms-{target_org}.sh"
 
@@ -159,7 +165,7 @@ def post_migration(workbook_path, dry_run, wave):
             "snapshots", "before", "source", source_org, "team-users.csv"
         )
 
-        team_users_df = pd.read_csv(team_users_file)
+        team_users_df = load_table(team_users_file)
 
         # The mannequins file contains the mapping of mannequin-user to target-user
         mannequins_df = get_mannequin_df(workbook_path)
@@ -3,8 +3,13 @@ import pandas as pd
 
 import os
 import base64
+import asyncio
 from functools import lru_cache
-from githubkit import GitHub
+from migrate.client import GitHub
+from migrate.ratelimit import rate_limiter
+from migrate.cache import http_cache, CACHE_DIR, CACHE_SIZE
+from migrate.metrics import metrics
+from migrate.tables import FORMATS, save_table, parquet_available
 from ..version import *
 
 from migrate.workbook import get_included_orgs_by_wave
@@ -12,7 +17,12 @@ from migrate.workbook import get_included_orgs_by_wave
 
 @click.command()
 @click.option("--org", "orgs", multiple=True)
-@click.option("--pat", "pat")
+@click.option(
+    "--pat",
+    "pats",
+    multiple=True,
+    help="Token to use, repeat it to spread requests across several tokens",
+)
 @click.option("--before", is_flag=True, help="Run before migration")
 @click.option("--after", is_flag=True, help="Run after migration")
 @click.option("--source", is_flag=True, help="Source organization(s)")
@@ -26,10 +36,62 @@ from migrate.workbook import get_included_orgs_by_wave
     required=False,
     default="./report/InfoMagnus - Migration Workbook.xlsx",
 )
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of teams to snapshot at once",
+)
+@click.option(
+    "--org-concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of orgs to snapshot at once",
+)
+@click.option(
+    "--cache-dir",
+    default=CACHE_DIR,
+    show_default=True,
+    help="Directory REST responses are cached in",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=CACHE_SIZE,
+    show_default=True,
+    help="Maximum size of the HTTP cache, in MB",
+)
+@click.option("--no-cache", is_flag=True, help="Don't cache REST responses on disk")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(list(FORMATS)),
+    default="csv",
+    show_default=True,
+    help="Save the snapshots as CSV, or as typed, compressed Parquet",
+)
 @click.argument("output_dir", required=False, default="logs")
 # @snapshot_before_after()
+@metrics.command("snapshots")
 def snapshots(
-    orgs, pat, before, after, source, target, dry_run, wave, workbook_path, output_dir
+    orgs,
+    pats,
+    before,
+    after,
+    source,
+    target,
+    dry_run,
+    wave,
+    workbook_path,
+    concurrency,
+    org_concurrency,
+    cache_dir,
+    cache_size,
+    no_cache,
+    output_format,
+    output_dir,
 ):
     ##########################################
     # Check command line fslags
@@ -38,6 +100,8 @@ def snapshots(
         raise click.UsageError("You must supply either --before or --after")
     if not (source ^ target):
         raise click.UsageError("You must supply either --source or --target")
+    if output_format == "parquet" and not parquet_available():
+        raise click.UsageError("--format parquet needs pyarrow, pip install pyarrow")
 
     ##########################################
     # Build output file name
@@ -71,6 +135,9 @@ def snapshots(
     ##########################################
     # Housekeeping
     ##########################################
+    if not no_cache:
+        http_cache.configure(cache_dir, cache_size)
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
@@ -87,15 +154,30 @@ def snapshots(
     print(f"* Inventorying {orgs}")
 
     if orgs is not None:
-        for org in orgs:
-            print(f"\n* Processing org {org}")
-            github = GitHub(pat)
-            if source:
-                generate_snapshots("before", "source", org, pat)
-            elif target:
-                generate_snapshots("before", "target", org, pat)
-            else:
-                raise ValueError("Invalid source/target")
+        if source:
+            type = "source"
+        elif target:
+            type = "target"
+        else:
+            raise ValueError("Invalid source/target")
+
+        github = GitHub.from_tokens(pats)
+        asyncio.run(
+            generate_org_snapshots(
+                github,
+                "before",
+                type,
+                orgs,
+                org_concurrency,
+                concurrency,
+                output_format,
+            )
+        )
+
+    rate_limiter.print_usage()
+    if orgs is not None and github.token_pool is not None:
+        github.token_pool.print_usage()
+    http_cache.print_usage()
 
     # checkpoint_file(output_path, f"STATS: Saving new {output_path}")
 
@@ -103,76 +185,119 @@ def snapshots(
 ##########################
 # Generate snapshots
 ##########################
-def generate_snapshots(timing, type, org_name, pat):
-    """ """
-    print(f"*** Generating {timing} {type} snapshots")
-    github = GitHub(pat)
+async def generate_org_snapshots(
+    github, timing, type, orgs, org_concurrency=1, concurrency=1, format="csv"
+):
+    """Snapshots orgs, `org_concurrency` at a time, over one shared client"""
+    semaphore = asyncio.Semaphore(org_concurrency)
+
+    async def generate_org_snapshot(org):
+        async with semaphore:
+            print(f"\n* Processing org {org}")
+            await generate_snapshots(github, timing, type, org, concurrency, format)
+
+    async with github:
+        await asyncio.gather(*[generate_org_snapshot(org) for org in orgs])
 
-    def paginate(api_func, **kwargs):
+
+@metrics.timed("snapshots.org")
+async def generate_snapshots(
+    github, timing, type, org_name, concurrency=1, format="csv"
+):
+    """Enter `github`'s async context first, so its connections are reused"""
+    print(f"*** Generating {timing} {type} snapshots of {org_name}")
+
+    async def paginate(api_func, **kwargs):
         # See the githubkit README for more info about map_func
         pages = github.paginate(api_func, map_func=lambda r: r.json(), **kwargs)
-        return pd.DataFrame([page for page in pages])
+        return pd.DataFrame([page async for page in pages])
 
-    def write_to_csv(dataframe, filename):
+    @metrics.timed("snapshots.write")
+    def write_snapshot(dataframe, filename):
         output_dir = os.path.dirname(
             os.path.join("snapshots", timing, type, org_name, filename)
         )
         os.makedirs(output_dir, exist_ok=True)
 
-        dataframe.to_csv(
-            os.path.join(output_dir, os.path.basename(filename)), index=False
+        save_table(
+            dataframe, os.path.join(output_dir, os.path.basename(filename)), format
         )
 
-    # Save all users in organization
-    users = paginate(github.rest.orgs.list_members, org=org_name)
-    write_to_csv(users, "users.csv")
-
-    # Save all repos in organization
-    repos = paginate(github.rest.repos.list_for_org, org=org_name)
-    write_to_csv(repos, "repos.csv")
-
-    # # Save all teams in organization
-    teams = paginate(github.rest.teams.list, org=org_name)
-    write_to_csv(teams, "teams.csv")
-
-    all_team_repos = []
-    all_team_users = []
-
-    for team in teams.to_dict(orient="records"):
-        team_slug = team["slug"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_team(team_slug, admin_logins):
+        async with semaphore:
+            team_repos, team_users, maintainers = await asyncio.gather(
+                paginate(
+                    github.rest.teams.async_list_repos_in_org,
+                    org=org_name,
+                    team_slug=team_slug,
+                ),
+                paginate(
+                    github.rest.teams.async_list_members_in_org,
+                    org=org_name,
+                    team_slug=team_slug,
+                ),
+                paginate(
+                    github.rest.teams.async_list_members_in_org,
+                    org=org_name,
+                    team_slug=team_slug,
+                    role="maintainer",
+                ),
+            )
 
         ############################
         # Save each team's repos
         ############################
-        team_repos = paginate(
-            github.rest.teams.list_repos_in_org,
-            org=org_name,
-            team_slug=team_slug,
-        )
         # Add the team slug to the dataframe
         team_repos["team_slug"] = team_slug
-        all_team_repos.append(team_repos)
 
         ############################
         # Save each team's users
         ############################
-        team_users = paginate(
-            github.rest.teams.list_members_in_org,
-            org=org_name,
-            team_slug=team_slug,
-        )
         # Add the team slug to the dataframe
         team_users["team_slug"] = team_slug
 
-        # Add each user's role to the dataframe
-        for i, user in team_users.iterrows():
-            response = github.rest.teams.get_membership_for_user_in_org(
-                org=org_name, team_slug=team_slug, username=user["login"]
-            )
-            response = response.json()
-            team_users.loc[i, "role"] = response["role"]
+        # Add each user's role to the dataframe. As in the team membership
+        # API, org owners are maintainers, and anyone else who isn't one of
+        # the team's maintainers is a member.
+        if not team_users.empty:
+            maintainer_logins = set(maintainers.get("login", [])) | admin_logins
+            team_users["role"] = [
+                "maintainer" if login in maintainer_logins else "member"
+                for login in team_users["login"]
+            ]
+
+        return team_repos, team_users
+
+    # Save all users in organization
+    users = await paginate(github.rest.orgs.async_list_members, org=org_name)
+    write_snapshot(users, "users.csv")
+
+    # The org's owners, to tell which team members are maintainers
+    admins = await paginate(
+        github.rest.orgs.async_list_members, org=org_name, role="admin"
+    )
+    admin_logins = set(admins.get("login", []))
+
+    # Save all repos in organization
+    repos = await paginate(github.rest.repos.async_list_for_org, org=org_name)
+    write_snapshot(repos, "repos.csv")
+
+    # # Save all teams in organization
+    teams = await paginate(github.rest.teams.async_list, org=org_name)
+    write_snapshot(teams, "teams.csv")
+
+    # Teams are fetched `concurrency` at a time, but kept in order
+    team_snapshots = await asyncio.gather(
+        *[
+            get_team(team["slug"], admin_logins)
+            for team in teams.to_dict(orient="records")
+        ]
+    )
 
-        all_team_users.append(team_users)
+    all_team_repos = [team_repos for team_repos, _ in team_snapshots]
+    all_team_users = [team_users for _, team_users in team_snapshots]
 
     all_team_repos = pd.concat(all_team_repos, ignore_index=True)
     all_team_users = pd.concat(all_team_users, ignore_index=True)
@@ -188,8 +313,8 @@ def generate_snapshots(timing, type, org_name, pat):
         + [col for col in all_team_users.columns if col not in ["team_slug", "role"]]
     ]
 
-    write_to_csv(all_team_repos, "team-repos.csv")
-    write_to_csv(all_team_users, "team-users.csv")
+    write_snapshot(all_team_repos, "team-repos.csv")
+    write_snapshot(all_team_users, "team-users.csv")
 
 
 def get_pat(type):
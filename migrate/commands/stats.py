@@ -2,17 +2,47 @@ import click
 import pandas as pd
 
 import os
+import copy
 import base64
-from functools import lru_cache
-from githubkit import GitHub
+import asyncio
+from datetime import datetime
+from migrate.client import GitHub
+from migrate.ratelimit import rate_limiter
+from migrate.cache import http_cache, CACHE_DIR, CACHE_SIZE
+from migrate.checkpoint import Journal
+from migrate.counters import count_nodes
+from migrate.metrics import metrics
+from migrate.statsfile import (
+    StatsWriter,
+    COUNTED_FIELDS,
+    stats_columns,
+    read_header,
+    read_stats,
+    convert_stats,
+)
+from migrate.tables import FORMATS, find_table, parquet_available
 from ..version import *
 
+from migrate.queries import (
+    get_query,
+    build_batch_query,
+    build_batch_variables,
+    split_batch_response,
+)
 from migrate.workbook import get_included_orgs_by_wave
 
+# Number of repos whose first page of issues and PRs is fetched in one query
+BATCH_SIZE = 10
+
 
 @click.command()
 @click.option("--org", "orgs", multiple=True)
-@click.option("--pat", "pat")
+@click.option(
+    "--pat",
+    "pats",
+    multiple=True,
+    help="Token to use, repeat it to spread requests across several tokens",
+)
 @click.option("--before", is_flag=True, help="Run before migration")
 @click.option("--after", is_flag=True, help="Run after migration")
 @click.option("--source", is_flag=True, help="Source organization(s)")
@@ -26,10 +56,97 @@ from migrate.workbook import get_included_orgs_by_wave
     required=False,
     default="./report/InfoMagnus - Migration Workbook.xlsx",
 )
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of repos to process at once",
+)
+@click.option(
+    "--org-concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of orgs to process at once",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Skip repos a previous, interrupted run already inventoried",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Number of times to retry repos that failed",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only refresh repos that changed since the previous stats file",
+)
+@click.option(
+    "--previous",
+    "previous_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Previous stats file for --incremental "
+    "(default: the matching --before file, or the existing output file)",
+)
+@click.option(
+    "--distribution",
+    is_flag=True,
+    help="Also record the min, max and percentiles of comments, commits and "
+    "timeline items per issue and PR",
+)
+@click.option(
+    "--cache-dir",
+    default=CACHE_DIR,
+    show_default=True,
+    help="Directory REST responses are cached in",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=CACHE_SIZE,
+    show_default=True,
+    help="Maximum size of the HTTP cache, in MB",
+)
+@click.option("--no-cache", is_flag=True, help="Don't cache REST responses on disk")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(list(FORMATS)),
+    default="csv",
+    show_default=True,
+    help="Save the stats as CSV, or as typed, compressed Parquet once they're done",
+)
 @click.argument("output_dir", required=False, default="logs")
 # @snapshot_before_after()
+@metrics.command("stats")
 def stats(
-    orgs, pat, before, after, source, target, dry_run, wave, workbook_path, output_dir
+    orgs,
+    pats,
+    before,
+    after,
+    source,
+    target,
+    dry_run,
+    wave,
+    workbook_path,
+    concurrency,
+    org_concurrency,
+    resume,
+    retries,
+    incremental,
+    previous_path,
+    distribution,
+    cache_dir,
+    cache_size,
+    no_cache,
+    output_format,
+    output_dir,
 ):
     ##########################################
     # Check command line fslags
@@ -38,6 +155,8 @@ def stats(
         raise click.UsageError("You must supply either --before or --after")
     if not (source ^ target):
         raise click.UsageError("You must supply either --source or --target")
+    if output_format == "parquet" and not parquet_available():
+        raise click.UsageError("--format parquet needs pyarrow, pip install pyarrow")
 
     ##########################################
     # Build output file name
@@ -71,6 +190,9 @@ def stats(
     ##########################################
     # Housekeeping
     ##########################################
+    if not no_cache:
+        http_cache.configure(cache_dir, cache_size)
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
@@ -78,113 +200,340 @@ def stats(
 
     # checkpoint_file(output_path, f"STATS: Saving old {output_path}")
 
-    if os.path.exists(output_path):
-        os.remove(output_path)
+    # Read the previous stats before output_path is cleared
+    previous = None
+    if incremental:
+        if previous_path is None and after:
+            previous_path = os.path.join(
+                "./", output_dir, output_file.replace("after-", "before-")
+            )
+        elif previous_path is None:
+            previous_path = output_path
+
+        previous_path = find_table(previous_path)
+        if not os.path.exists(previous_path):
+            raise click.UsageError(
+                f"--incremental needs a previous stats file, {previous_path} not found"
+            )
+
+        print(f"* Refreshing repos changed since {previous_path}")
+        previous = read_previous_stats(previous_path)
+
+    # The journal records which repos have been written to output_path
+    journal = Journal(f"{output_path}.journal")
+
+    if resume:
+        if (
+            os.path.exists(output_path)
+            and os.path.getsize(output_path)
+            and read_header(output_path) != stats_columns(distribution)
+        ):
+            raise click.UsageError(
+                f"{output_path} was written with different columns, "
+                "re-run without --resume to start it over"
+            )
+
+        journal.load()
+        journal_written_rows(output_path, journal, orgs)
+        print(f"* Resuming, {len(journal.done)} repos already inventoried")
+    else:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        journal.remove()
 
     ##########################################
     # The main event
     ##########################################
     print(f"* Inventorying {orgs}")
 
+    failed_orgs = []
+
     if orgs is not None:
-        for org in orgs:
-            print(f"\n* Processing org {org}")
-            github = GitHub(pat)
-            if source:
-                process_org(github, "source", org, output_path)
-            elif target:
-                process_org(github, "target", org, output_path)
-            else:
-                raise ValueError("Invalid source/target")
+        if source:
+            type = "source"
+        elif target:
+            type = "target"
+        else:
+            raise ValueError("Invalid source/target")
+
+        github = GitHub.from_tokens(pats)
+        failed_orgs = asyncio.run(
+            process_orgs(
+                github,
+                type,
+                orgs,
+                org_concurrency,
+                output_dir=output_path,
+                concurrency=concurrency,
+                journal=journal,
+                retries=retries,
+                previous=previous,
+                distribution=distribution,
+            )
+        )
+
+    rate_limiter.print_usage()
+    if orgs is not None and github.token_pool is not None:
+        github.token_pool.print_usage()
+    http_cache.print_usage()
+
+    if failed_orgs or journal.failed:
+        for org, repo in journal.failed:
+            print(f"Error: failed to process repo {org}/{repo}")
+        raise click.ClickException(
+            f"{len(failed_orgs)} org(s) and {len(journal.failed)} repo(s) failed, "
+            "re-run with --resume to retry them"
+        )
+
+    # Rows are appended to the CSV as they come in, so --resume can pick up
+    # where a run left off, and only converted once every repo is in
+    if output_format != "csv":
+        print(f"* Saved stats to {convert_stats(output_path, output_format)}")
 
     # checkpoint_file(output_path, f"STATS: Saving new {output_path}")
 
 
-def process_org(github, source, org, output_dir):
-    """Process all repos in an org"""
+async def process_orgs(github, source, orgs, org_concurrency=1, **kwargs):
+    """Process orgs, `org_concurrency` at a time, and return the ones that failed
 
-    ############################################################
-    # Recursively cleanup all pageInfos and nodes from repo dict
-    ############################################################
-    def cleanup_repo(d):
-        if isinstance(d, dict):
-            if "pageInfo" in d:
-                del d["pageInfo"]
-            if "nodes" in d:
-                del d["nodes"]
-            for k, v in d.items():
-                cleanup_repo(v)
-        elif isinstance(d, list):
-            for i in d:
-                cleanup_repo(i)
+    Every org shares the one client, and so its pool of keep-alive connections
+    and the rate limiter's budget for the token.
+    """
+    semaphore = asyncio.Semaphore(org_concurrency)
+    failed_orgs = []
 
-    ############################################################
-    # Get repos
-    ############################################################
-    repos = get_repos(github, org)
+    async def try_process_org(org):
+        async with semaphore:
+            print(f"\n* Processing org {org}")
+            try:
+                await process_org(github, source, org, **kwargs)
+            except Exception as e:
+                # Move on to the next org, the repos already written are journaled
+                print(f"Error: failed to process org {org}: {e!r}")
+                failed_orgs.append(org)
+
+    async with github:
+        await asyncio.gather(*[try_process_org(org) for org in orgs])
+
+    return [org for org in orgs if org in failed_orgs]
+
+
+async def process_org(
+    github,
+    source,
+    org,
+    output_dir,
+    concurrency=1,
+    journal=None,
+    retries=0,
+    previous=None,
+    distribution=False,
+):
+    """Process all repos in an org, `concurrency` repos at a time
+
+    Repos already done in the journal are skipped. Repos that fail are
+    retried up to `retries` times once the rest of the org is done, and
+    are then recorded as failed in the journal.
+
+    If `previous` stats are given, only the repos' names and dates are
+    listed. Repos whose `pushedAt` and `updatedAt` match their previous row
+    have that row copied forward, and only the rest are fetched in full.
+
+    With `distribution`, the issue and PR counts also get min, max and
+    percentile columns.
+
+    Enter `github`'s async context first, so its connections are reused.
+    """
+
+    columns = stats_columns(distribution)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_repo(repo, batch, index):
+        async with semaphore:
+            print(f'** Processing repo "{repo["name"]}"')
+
+            # First page of issues and PRs, if the batched query found the repo
+            pages = dict((await batch)[index] or {})
+            issues_page = pages.pop("issuesPage", None)
+            pull_requests_page = pages.pop("pullRequestsPage", None)
+
+            # Incremental runs only list each repo's name and dates, so the
+            # batched query brought back the rest of its fields. If the batch
+            # failed, or had nothing for this repo, it's fetched on its own and
+            # its issues and PRs are paged from the start.
+            if previous is not None:
+                if pages:
+                    repo = pages
+                else:
+                    with metrics.phase("stats.repo_fields"):
+                        repo = await get_repo_fields(github, repo)
+
+            ############################################################
+            # Get issues
+            ############################################################
+            with metrics.phase("stats.issues"):
+                issues = await count_nodes(
+                    get_issues(github, repo, issues_page),
+                    COUNTED_FIELDS["issues"],
+                    distribution,
+                )
+            for field, counter in issues.items():
+                repo["issues"][field] = counter.summary()
+
+            ############################################################
+            # Get PRs
+            ############################################################
+            with metrics.phase("stats.pull_requests"):
+                pulls = await count_nodes(
+                    get_pulls(github, repo, pull_requests_page),
+                    COUNTED_FIELDS["pullRequests"],
+                    distribution,
+                )
+            for field, counter in pulls.items():
+                repo["pullRequests"][field] = counter.summary()
 
-    for repo in repos:
-        print(f'** Processing repo "{repo["name"]}"')
+            # Add in the REST API stats
+            with metrics.phase("stats.rest_api"):
+                await get_rest_api_stats(github, repo)
 
-        ############################################################
-        # Get issues
-        ############################################################
-        issues = pd.DataFrame([issue for issue in get_issues(github, repo)])
+            # Add source
+            repo["Source"] = source
 
-        if len(issues) == 0:
-            repo["issues"]["comments"] = {"totalCount": 0}
-            repo["issues"]["timelineItems"] = {"totalCount": 0}
-        else:
-            # Sum comments
-            repo["issues"]["comments"] = {
-                "totalCount": sum([i["totalCount"] for i in issues["comments"]])
-            }
-            # Sum timelineItems
-            repo["issues"]["timelineItems"] = {
-                "totalCount": sum([i["totalCount"] for i in issues["timelineItems"]])
-            }
+            # Add date and time
+            repo["Inventoried"] = datetime.now()
+
+            return repo
+
+    async def try_process_repo(repo, batch, index, failed):
+        try:
+            # Work on a copy, so a failed repo can be retried from scratch
+            return await process_repo(copy.deepcopy(repo), batch, index)
+        except Exception as e:
+            print(f'** Failed to process repo "{repo["name"]}": {e!r}')
+            failed.append((repo, repr(e)))
+
+    def get_unchanged_row(repo):
+        """Returns the repo's previous row, if it hasn't changed since"""
+        if previous is None:
+            return None
+
+        row = previous.get((repo["owner"]["login"], repo["name"]))
+        if (
+            row is not None
+            and row["pushedAt"] == (repo["pushedAt"] or "")
+            and row["updatedAt"] == (repo["updatedAt"] or "")
+        ):
+            return row
+
+    async def process_repos(repos):
+        """Processes repos and returns the ones that failed"""
+
+        failed = []
 
         ############################################################
-        # Get PRs
+        # Write repos in the order they were listed, as they finish
         ############################################################
-        pulls = pd.DataFrame([pull for pull in get_pulls(github, repo)])
+        # The queue holds one task per repo. Its size bounds how far the
+        # repo listing can run ahead of the writer.
+        queue = asyncio.Queue(maxsize=concurrency)
+
+        writer = StatsWriter(output_dir, columns)
+
+        # Repos buffered in the writer, journaled once they're on disk
+        written = []
+
+        def flush():
+            with metrics.phase("stats.write_csv"):
+                writer.flush()
+
+            if journal is not None:
+                for name in written:
+                    journal.mark_done(org, name)
+            written.clear()
+
+        async def write_repos():
+            while (task := await queue.get()) is not None:
+                repo = await task
+                if repo is None:
+                    continue
+
+                written.append(repo["name"])
+                if writer.write(repo):
+                    flush()
+
+            flush()
+
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(write_repos())
+
+            async def submit(batch_repos):
+                batch = tasks.create_task(
+                    get_repo_pages(
+                        github,
+                        batch_repos,
+                        "repo-pages" if previous is None else "repo-changed",
+                    )
+                )
+                for index, repo in enumerate(batch_repos):
+                    await queue.put(
+                        tasks.create_task(try_process_repo(repo, batch, index, failed))
+                    )
 
-        if len(pulls) == 0:
-            repo["pullRequests"]["comments"] = {"totalCount": 0}
-            repo["pullRequests"]["commits"] = {"totalCount": 0}
-            repo["pullRequests"]["timelineItems"] = {"totalCount": 0}
-        else:
-            # Sum comments
-            repo["pullRequests"]["comments"] = {
-                "totalCount": sum([i["totalCount"] for i in pulls["comments"]])
-            }
-            # Sum commits
-            repo["pullRequests"]["commits"] = {
-                "totalCount": sum([i["totalCount"] for i in pulls["commits"]])
-            }
-            # Sum timelineItems
-            repo["pullRequests"]["timelineItems"] = {
-                "totalCount": sum([i["totalCount"] for i in pulls["timelineItems"]])
-            }
+            batch_repos = []
+            async for repo in repos:
+                if journal is not None and journal.is_done(org, repo["name"]):
+                    continue
+
+                row = get_unchanged_row(repo)
+                if row is not None:
+                    print(f'** Copying forward unchanged repo "{repo["name"]}"')
 
-        # Add in the REST API stats
-        get_rest_api_stats(github, repo)
+                    # Submit the repos before it, so rows stay in order
+                    if batch_repos:
+                        await submit(batch_repos)
+                        batch_repos = []
 
-        # Remove pageInfos and nodes
-        cleanup_repo(repo)
+                    carried = asyncio.get_running_loop().create_future()
+                    carried.set_result(row)
+                    await queue.put(carried)
+                    continue
 
-        # Add source
-        repo["Source"] = source
+                batch_repos.append(repo)
+                if len(batch_repos) == BATCH_SIZE:
+                    await submit(batch_repos)
+                    batch_repos = []
 
-        # Add date and time
-        repo["Inventoried"] = pd.Timestamp.now()
+            if batch_repos:
+                await submit(batch_repos)
 
-        # Normalize column headings
-        repo = pd.json_normalize(repo)
+            await queue.put(None)
 
-        # Write to file
-        with open(output_dir, "a") as f:
-            repo.to_csv(f, header=f.tell() == 0, index=False)
+        return failed
+
+    async def iterate(items):
+        for item in items:
+            yield item
+
+    ############################################################
+    # Get repos
+    ############################################################
+    if previous is None:
+        failed = await process_repos(get_repos(github, org))
+    else:
+        failed = await process_repos(get_updated_repos(github, org))
+
+    # Retry queue. The rows of repos that succeed are appended after the rest
+    # of the org's, out of listing order.
+    for attempt in range(retries):
+        if not failed:
+            break
+
+        print(f"\n** Retrying {len(failed)} failed repo(s) in {org}")
+        failed = await process_repos(iterate([repo for repo, _ in failed]))
+
+    for repo, error in failed:
+        if journal is not None:
+            journal.mark_failed(org, repo["name"], error)
 
 
 def get_pat(type):
@@ -196,8 +545,90 @@ def get_pat(type):
         raise ValueError('Type must be "source" or "target"')
 
 
-def get_issues(github, repo):
-    yield from get_nodes(
+def journal_written_rows(path, journal, orgs=None):
+    """Marks the repos already in an interrupted run's CSV as done
+
+    Rows are appended before their repos are journaled, so a crash can leave
+    up to a batch of rows the journal doesn't know about. They're kept, and
+    their repos skipped, rather than written twice. A half-written last row is
+    cut off.
+    """
+    if not os.path.exists(path):
+        return
+
+    truncate_partial_row(path)
+    if not os.path.getsize(path):
+        return
+
+    # Rows name the repo's owner, the journal the org as it was given
+    orgs_by_login = {org.lower(): org for org in orgs or []}
+
+    rows = pd.read_csv(
+        path, usecols=["owner.login", "name"], dtype=str, keep_default_na=False
+    )
+    for login, name in zip(rows["owner.login"], rows["name"]):
+        org = orgs_by_login.get(login.lower(), login)
+        if not journal.is_done(org, name):
+            journal.mark_done(org, name)
+
+
+def truncate_partial_row(path, chunk_size=64 * 1024):
+    """Cuts a file back to the end of its last complete line"""
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - chunk_size, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+
+        f.truncate(end)
+
+
+def read_previous_stats(path):
+    """Reads a previous stats file, keyed by (owner.login, name)"""
+    rows = read_stats(path, strings=True)
+    return {
+        (row["owner.login"], row["name"]): row for row in rows.to_dict(orient="records")
+    }
+
+
+async def get_repo_pages(github, repos, fragment_file="repo-pages"):
+    """Fetches the first page of issues and PRs for many repos in one query"""
+
+    query = build_batch_query(fragment_file, len(repos))
+    variables = build_batch_variables(repos, 100)
+
+    try:
+        response = await github.async_graphql(query, variables=variables)
+    except Exception as e:
+        # One bad repo fails the whole batch, so let each repo page on its own
+        print(f"Error: batched query failed, falling back to per-repo queries: {e}")
+        return [None] * len(repos)
+
+    return split_batch_response(response, len(repos))
+
+
+async def get_repo_fields(github, repo):
+    """Fetches a single repo's RepoFields, e.g. when its batch failed"""
+
+    query = build_batch_query("repo-fields", 1)
+    variables = build_batch_variables([repo])
+
+    response = await github.async_graphql(query, variables=variables)
+
+    [fields] = split_batch_response(response, 1)
+    if fields is None:
+        raise ValueError(f'Repo "{repo["owner"]["login"]}/{repo["name"]}" not found')
+
+    return fields
+
+
+async def get_issues(github, repo, first_page=None):
+    async for issue in get_nodes(
         github,
         "issues",
         {
@@ -207,11 +638,13 @@ def get_issues(github, repo):
             "endCursor": None,
         },
         ["repository", "issues"],
-    )
+        first_page,
+    ):
+        yield issue
 
 
-def get_pulls(github, repo):
-    yield from get_nodes(
+async def get_pulls(github, repo, first_page=None):
+    async for pull in get_nodes(
         github,
         "pulls",
         {
@@ -221,25 +654,37 @@ def get_pulls(github, repo):
             "endCursor": None,
         },
         ["repository", "pullRequests"],
-    )
+        first_page,
+    ):
+        yield pull
 
 
-def get_repos(github, org):
-    yield from get_nodes(
+async def get_repos(github, org):
+    async for repo in get_nodes(
         github,
         "org-repos",
         {"login": org, "pageSize": 10, "endCursor": None},
         ["organization", "repositories"],
-    )
+    ):
+        yield repo
 
 
-def get_nodes(github, query_name, variables, page_path):
-    """Retrieves all nodes from a paginated GraphQL query"""
+async def get_updated_repos(github, org):
+    async for repo in get_nodes(
+        github,
+        "org-repos-updated",
+        {"login": org, "pageSize": 100, "endCursor": None},
+        ["organization", "repositories"],
+    ):
+        yield repo
 
-    @lru_cache(maxsize=None)
-    def get_query(name):
-        with open(f"migrate/graphql/{name}.graphql") as f:
-            return f.read()
+
+async def get_nodes(github, query_name, variables, page_path, first_page=None):
+    """Retrieves all nodes from a paginated GraphQL query
+
+    If `first_page` was already fetched (e.g. by a batched query), its nodes
+    are yielded first and the cursor loop only runs if there are more pages.
+    """
 
     # https://stackoverflow.com/questions/71460721/best-way-to-get-nested-dictionary-items
     def get_nested_item(d, key):
@@ -249,8 +694,17 @@ def get_nodes(github, query_name, variables, page_path):
 
     query = get_query(query_name)
 
+    if first_page is not None:
+        for item in first_page["nodes"]:
+            yield item
+
+        if not first_page["pageInfo"]["hasNextPage"]:
+            return
+
+        variables["endCursor"] = first_page["pageInfo"]["endCursor"]
+
     while True:
-        response = github.graphql(query, variables=variables)
+        response = await github.async_graphql(query, variables=variables)
 
         # Print errors and exit if any found
         if "errors" in response:
@@ -270,94 +724,118 @@ def get_nodes(github, query_name, variables, page_path):
         variables["endCursor"] = items["pageInfo"]["endCursor"]
 
 
-def get_rest_api_stats(github: GitHub, repo: dict):
+async def get_rest_api_stats(github: GitHub, repo: dict):
     """Retrieves stats from the REST API for a repo, as
-    the GraphQL API does not provide all stats"""
+    the GraphQL API does not provide all stats
+
+    None of the calls depend on each other, so they're all sent at once.
+    """
 
     repo_name = repo["name"]
     org_name = repo["owner"]["login"]
 
+    async def optional(request):
+        try:
+            return await request
+        except Exception:
+            return None
+
+    (
+        webhooks,
+        workflows,
+        workflow_runs,
+        branches,
+        teams,
+        environments,
+        secrets_actions_repo,
+        secrets_actions_org,
+        secrets_dependabot,
+        secrets_codespaces,
+        details,
+        gitattributes,
+    ) = await asyncio.gather(
+        github.rest.repos.async_list_webhooks(owner=org_name, repo=repo_name),
+        github.rest.actions.async_list_repo_workflows(org_name, repo_name),
+        github.rest.actions.async_list_workflow_runs_for_repo(org_name, repo_name),
+        github.rest.repos.async_list_branches(org_name, repo_name),
+        github.rest.repos.async_list_teams(org_name, repo_name),
+        github.rest.repos.async_get_all_environments(org_name, repo_name),
+        github.rest.actions.async_list_repo_secrets(org_name, repo_name),
+        github.rest.actions.async_list_repo_organization_secrets(org_name, repo_name),
+        github.rest.dependabot.async_list_repo_secrets(org_name, repo_name),
+        optional(github.rest.codespaces.async_list_repo_secrets(org_name, repo_name)),
+        github.rest.repos.async_get(org_name, repo_name),
+        optional(
+            github.rest.repos.async_get_content(org_name, repo_name, ".gitattributes")
+        ),
+    )
+
     ############################################################
     # Get webhooks count
     ############################################################
-    response = github.rest.repos.list_webhooks(owner=org_name, repo=repo_name)
-    repo["webhooks"] = {"totalCount": len(response.json())}
+    repo["webhooks"] = {"totalCount": len(webhooks.json())}
 
     ############################################################
     # Get workflows count
     ############################################################
-    response = github.rest.actions.list_repo_workflows(org_name, repo_name)
-    repo["workflows"] = {"totalCount": response.json()["total_count"]}
+    repo["workflows"] = {"totalCount": workflows.json()["total_count"]}
 
     ############################################################
     # Get last workflow run
     ############################################################
-    response = github.rest.actions.list_workflow_runs_for_repo(org_name, repo_name)
-    if response.json()["total_count"] == 0:
+    if workflow_runs.json()["total_count"] == 0:
         repo["lastWorkflowRun"] = None
     else:
-        repo["lastWorkflowRun"] = response.json()["workflow_runs"][0]["created_at"]
+        repo["lastWorkflowRun"] = workflow_runs.json()["workflow_runs"][0]["created_at"]
 
     ############################################################
     # Get branches
     ############################################################
-    response = github.rest.repos.list_branches(org_name, repo_name)
-    if len(response.json()) == 0:
+    if len(branches.json()) == 0:
         repo["branches"] = None
     else:
-        repo["branches"] = [branch["name"] for branch in response.json()]
+        repo["branches"] = [branch["name"] for branch in branches.json()]
         repo["branches"].sort()
 
     ############################################################
     # Get teams
     ############################################################
-    response = github.rest.repos.list_teams(org_name, repo_name)
-    if len(response.json()) == 0:
+    if len(teams.json()) == 0:
         repo["teams"] = None
     else:
-        repo["teams"] = [team["name"] for team in response.json()]
+        repo["teams"] = [team["name"] for team in teams.json()]
         repo["teams"].sort()
 
     ############################################################
     # Get environments
     ############################################################
-    response = github.rest.repos.get_all_environments(org_name, repo_name)
-    repo["environments"] = response.json()["total_count"]
+    repo["environments"] = environments.json()["total_count"]
 
     ############################################################
     # Get secrets
     ############################################################
-    response = github.rest.actions.list_repo_secrets(org_name, repo_name)
-    repo["secrets_actions_repo"] = response.json()["total_count"]
-
-    response = github.rest.actions.list_repo_organization_secrets(org_name, repo_name)
-    repo["secrets_actions_org"] = response.json()["total_count"]
-
-    response = github.rest.dependabot.list_repo_secrets(org_name, repo_name)
-    repo["secrets_dependabot"] = response.json()["total_count"]
+    repo["secrets_actions_repo"] = secrets_actions_repo.json()["total_count"]
+    repo["secrets_actions_org"] = secrets_actions_org.json()["total_count"]
+    repo["secrets_dependabot"] = secrets_dependabot.json()["total_count"]
 
     try:
-        response = github.rest.codespaces.list_repo_secrets(org_name, repo_name)
-        repo["secrets_codespaces"] = response.json()["total_count"]
+        repo["secrets_codespaces"] = secrets_codespaces.json()["total_count"]
     except:
         repo["secrets_codespaces"] = None
 
     ############################################################
     # Get repository topics, perms, visibility, security
     ############################################################
-    response = github.rest.repos.get(org_name, repo_name)
-    repo["topics"] = response.json()["topics"].sort()
-    repo["permissions"] = response.json()["permissions"]
-    repo["visibility"] = response.json()["visibility"]
-    repo["security_and_analysis"] = response.json()["security_and_analysis"]
+    repo["topics"] = details.json()["topics"].sort()
+    repo["permissions"] = details.json()["permissions"]
+    repo["visibility"] = details.json()["visibility"]
+    repo["security_and_analysis"] = details.json()["security_and_analysis"]
 
     ############################################################
     # Check if GitLFS being used by checking .gitattributes
     ############################################################
     try:
-        response = github.rest.repos.get_content(org_name, repo_name, ".gitattributes")
-
         # If .gitattributes contains the string '=lfs', then git LFS is enabled
-        repo["hasGitLFS"] = "=lfs" in base64.b64decode(response.json()["content"])
+        repo["hasGitLFS"] = "=lfs" in base64.b64decode(gitattributes.json()["content"])
     except Exception as e:
         repo["hasGitLFS"] = False
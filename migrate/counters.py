@@ -0,0 +1,97 @@
+###############################################################################
+# Streaming counters for the per-issue / per-PR totals in stats
+#
+# A repo can have hundreds of thousands of issues or PRs, so nodes are folded
+# into running totals as they're paged in rather than collected first. The
+# optional distribution is kept in a fixed set of log-spaced buckets, so
+# memory stays constant however large the repo is.
+###############################################################################
+
+# Values below this are counted exactly
+EXACT_BELOW = 128
+
+# Sub-buckets per power of two above EXACT_BELOW, percentiles are within
+# 1 / SUB_BUCKETS (~6%) of the true value
+SUB_BUCKETS = 16
+
+PERCENTILES = (50, 90, 99)
+
+
+def summary_fields(distribution=False):
+    """The keys of `Counter.summary()`"""
+    fields = ["totalCount"]
+    if distribution:
+        fields += ["min", "max"] + [f"p{q}" for q in PERCENTILES]
+    return fields
+
+
+def bucket(value):
+    if value < EXACT_BELOW:
+        return value
+    shift = value.bit_length() - SUB_BUCKETS.bit_length()
+    return (shift, value >> shift)
+
+
+def bucket_floor(key):
+    if isinstance(key, int):
+        return key
+    shift, top = key
+    return top << shift
+
+
+class Counter:
+    """Running total of one count, with an optional distribution"""
+
+    def __init__(self, distribution=False):
+        self.total = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.buckets = {} if distribution else None
+
+    def add(self, value):
+        self.total += value
+        self.count += 1
+
+        if self.buckets is None:
+            return
+
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        key = bucket(value)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def percentile(self, q):
+        """Approximate q-th percentile, rounded down to its bucket"""
+        if not self.count:
+            return None
+
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for key in sorted(self.buckets, key=bucket_floor):
+            seen += self.buckets[key]
+            if seen >= rank:
+                return max(bucket_floor(key), self.min)
+
+    def summary(self):
+        """The counter as a GitHub-style connection, e.g. {"totalCount": 12}"""
+        summary = {"totalCount": self.total}
+
+        if self.buckets is not None:
+            summary["min"] = self.min
+            summary["max"] = self.max
+            for q in PERCENTILES:
+                summary[f"p{q}"] = self.percentile(q)
+
+        return summary
+
+
+async def count_nodes(nodes, fields, distribution=False):
+    """Folds each node's `field.totalCount` into a Counter per field"""
+
+    counters = {field: Counter(distribution) for field in fields}
+    async for node in nodes:
+        for field, counter in counters.items():
+            counter.add(node[field]["totalCount"])
+
+    return counters
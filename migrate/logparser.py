@@ -0,0 +1,80 @@
+import re
+from dataclasses import dataclass
+
+###############################################################################
+# GEI migration logs
+#
+# The lines we care about start with a bracketed timestamp, e.g.
+#
+#   [2024-04-12T01:25:50Z] [INFO] Migration started...
+#
+# Each file is read in one go and scanned once. Most lines are INFO, so a
+# cheap substring check skips them before the keyword pattern runs.
+###############################################################################
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+KEYWORDS = re.compile(r"Migration (?:started|complete|failed)|WARN|ERROR")
+
+# Event kind for each keyword
+KINDS = {
+    "Migration started": "started",
+    "Migration complete": "complete",
+    "Migration failed": "failed",
+    "WARN": "WARN",
+    "ERROR": "ERROR",
+}
+
+# Event that ends a migration, by the directory its log is in
+END_KINDS = {"success": "complete", "failure": "failed"}
+
+
+@dataclass(slots=True)
+class LogEvent:
+    kind: str
+    timestamp: str
+    message: str
+
+
+def read_events(path):
+    """Returns an event for each keyword found on a timestamped line"""
+    events = []
+
+    with open(path, "r") as f:
+        content = f.read()
+
+    for line in content.split("\n"):
+        if not (
+            line.startswith("[")
+            and ("Migration " in line or "WARN" in line or "ERROR" in line)
+        ):
+            continue
+
+        # The timestamp is the first word, without the '[' and ']'
+        timestamp = line.split(" ")[0][1:-1]
+        message = line.strip()
+
+        # A line can have more than one keyword, e.g. a WARN about an ERROR
+        for keyword in set(KEYWORDS.findall(line)):
+            events.append(LogEvent(KINDS[keyword], timestamp, message))
+
+    return events
+
+
+def parse_repo_log(path, type):
+    """Returns the start and end timestamps, warnings and errors of a repo log
+
+    Runs in a worker process, so it only hands back plain values.
+    """
+    events = read_events(path)
+
+    # We should *always* have a start line
+    start = [event for event in events if event.kind == "started"]
+    assert len(start) == 1
+
+    end = [event for event in events if event.kind == END_KINDS[type]][0]
+
+    warnings = [event.message for event in events if event.kind == "WARN"]
+    errors = [event.message for event in events if event.kind == "ERROR"]
+
+    return (start[0].timestamp, end.timestamp, warnings, errors)
@@ -0,0 +1,137 @@
+import os
+import pickle
+import hashlib
+
+import pandas as pd
+from openpyxl import load_workbook
+
+###############################################################################
+# The mapping sheets are small, but the workbook around them grows large
+# inventory and report sheets. Only the mapping sheets are read, in read-only
+# mode, and they're kept in a sidecar cache until the workbook changes.
+#
+# The cache lives under .cache/ rather than next to the workbook, as report/
+# is committed on the engagement branch.
+###############################################################################
+
+CACHE_DIR = ".cache/mappings"
+
+MAPPING_SHEETS = ("Mapping - Org", "Mapping - User")
+
+# Indexes already loaded by this process, by (path, mtime, size)
+_indexes = {}
+
+
+class MappingIndex:
+    """In-memory copy of a workbook's mapping sheets"""
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def sheet(self, name):
+        if self.sheets.get(name) is None:
+            raise KeyError(f"Worksheet {name} does not exist.")
+        return self.sheets[name]
+
+    def orgs(self, wave=None, exclude=False):
+        """Rows of "Mapping - Org", optionally for a single wave"""
+        df = self.sheet("Mapping - Org")
+
+        rows = df["exclude"] == exclude
+        if wave is not None:
+            rows &= df["wave"] == wave
+
+        return df[rows]
+
+    def org_mapping(self, org_type, wave=None):
+        """Maps each included source org to its `org_type` name"""
+        orgs = self.orgs(wave)
+        return dict(zip(orgs["source_name"], orgs[org_type]))
+
+    def users(self, exclude=False):
+        """Rows of "Mapping - User" """
+        df = self.sheet("Mapping - User")
+        return df[df["exclude"] == exclude]
+
+
+def get_mapping_index(workbook_path):
+    """Returns the mapping sheets of a workbook, reading them at most once"""
+    stat = os.stat(workbook_path)
+    key = (os.path.abspath(workbook_path), stat.st_mtime_ns, stat.st_size)
+
+    if key not in _indexes:
+        _indexes[key] = MappingIndex(load_mapping_sheets(workbook_path, stat))
+
+    return _indexes[key]
+
+
+def load_mapping_sheets(workbook_path, stat):
+    cache_path = os.path.join(
+        CACHE_DIR,
+        hashlib.sha1(os.path.abspath(workbook_path).encode()).hexdigest() + ".pickle",
+    )
+
+    cached = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except Exception:
+            cached = None
+
+    # Unchanged since it was cached
+    if (
+        cached is not None
+        and cached["mtime"] == stat.st_mtime_ns
+        and cached["size"] == stat.st_size
+    ):
+        return cached["sheets"]
+
+    # Touched, e.g. by a checkout, but the same contents
+    digest = hash_file(workbook_path)
+    if cached is not None and cached["sha256"] == digest:
+        sheets = cached["sheets"]
+    else:
+        sheets = read_mapping_sheets(workbook_path)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_path, "wb") as f:
+        pickle.dump(
+            {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": digest,
+                "sheets": sheets,
+            },
+            f,
+        )
+
+    return sheets
+
+
+def read_mapping_sheets(workbook_path):
+    """Reads just the mapping sheets, None for any that don't exist yet"""
+    wb = load_workbook(workbook_path, read_only=True, data_only=True)
+
+    sheets = {}
+    for name in MAPPING_SHEETS:
+        if name not in wb.sheetnames:
+            sheets[name] = None
+            continue
+
+        data = list(wb[name].values)
+
+        # Set the first row as the header
+        sheets[name] = pd.DataFrame(data[1:], columns=data[0])
+
+    wb.close()
+
+    return sheets
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
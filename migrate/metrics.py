@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import threading
+import contextlib
+from datetime import datetime
+
+###############################################################################
+# Where a run spends its time
+#
+# Phases are named stretches of work (e.g. "stats.rest_api"), timed with
+# `metrics.phase()` or the `metrics.timed()` decorator. Concurrent repos each
+# time their own phases, so a phase's seconds can add up to more than the
+# run's wall time. Every request sent over the network is counted by endpoint,
+# with its latency and response size.
+#
+# Each command writes its metrics when it finishes, as `<command>.json` and a
+# `<command>.prom` textfile for the Prometheus node exporter.
+###############################################################################
+
+METRICS_DIR = ".cache/metrics"
+
+# Upper bounds of the request latency histogram, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+PREFIX = "gh_migrate"
+
+
+class Metrics:
+    """Phase timings and request counts for the current run"""
+
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.phases = {}
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            phase = self.phases.setdefault(name, {"count": 0, "seconds": 0.0})
+            phase["count"] += 1
+            phase["seconds"] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times the body of a `with` block as one run of the phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def timed(self, name):
+        """Decorator that times each call of a function, sync or async"""
+
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    with self.phase(name):
+                        return await func(*args, **kwargs)
+
+            else:
+
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    with self.phase(name):
+                        return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def command(self, name):
+        """Decorator for a CLI command, times it and writes its metrics"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    with self.phase(name):
+                        return func(*args, **kwargs)
+                finally:
+                    if self.directory:
+                        self.write(name)
+
+            return wrapper
+
+        return decorator
+
+    def record_request(self, request, response, seconds, size):
+        """Counts a request sent over the network, `size` is its body's size"""
+        key = endpoint(request)
+
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                key,
+                {
+                    "requests": {},
+                    "seconds": 0.0,
+                    "bytes": 0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                },
+            )
+            status = str(response.status_code)
+            stats["requests"][status] = stats["requests"].get(status, 0) + 1
+            stats["seconds"] += seconds
+            stats["bytes"] += size
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][index] += 1
+                    break
+
+    def rate_limit_points(self):
+        """Points used per resource, if any requests were rate limited"""
+        # Only loaded by commands that talk to GitHub
+        ratelimit = sys.modules.get("migrate.ratelimit")
+        if ratelimit is None:
+            return {}
+
+        points = {}
+        for (_, resource), budget in ratelimit.rate_limiter.budgets.items():
+            points[resource] = points.get(resource, 0) + budget.points
+        return points
+
+    def to_dict(self, command):
+        with self.lock:
+            return {
+                "command": command,
+                "finished": datetime.now().isoformat(timespec="seconds"),
+                "phases": {name: dict(phase) for name, phase in self.phases.items()},
+                "endpoints": {
+                    key: {
+                        "requests": dict(stats["requests"]),
+                        "seconds": stats["seconds"],
+                        "bytes": stats["bytes"],
+                        "latency_buckets": dict(
+                            zip(map(str, LATENCY_BUCKETS), stats["buckets"])
+                        ),
+                    }
+                    for key, stats in self.endpoints.items()
+                },
+                "rate_limit_points": self.rate_limit_points(),
+            }
+
+    def to_prometheus(self, command):
+        """The metrics in the Prometheus text exposition format"""
+        data = self.to_dict(command)
+        lines = []
+
+        def metric(name, type, help, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} {type}")
+            for suffix, labels, value in samples:
+                labels = format_labels(command=command, **labels)
+                lines.append(f"{PREFIX}_{name}{suffix}{labels} {value}")
+
+        phases = data["phases"].items()
+        endpoints = data["endpoints"].items()
+
+        metric(
+            "phase_seconds",
+            "gauge",
+            "Time spent in each phase of the run",
+            [("", {"phase": name}, phase["seconds"]) for name, phase in phases],
+        )
+        metric(
+            "phase_runs",
+            "gauge",
+            "Number of times each phase ran",
+            [("", {"phase": name}, phase["count"]) for name, phase in phases],
+        )
+        metric(
+            "requests_total",
+            "counter",
+            "Requests sent, by endpoint and status",
+            [
+                ("", {"endpoint": key, "status": status}, count)
+                for key, stats in endpoints
+                for status, count in stats["requests"].items()
+            ],
+        )
+        metric(
+            "response_bytes_total",
+            "counter",
+            "Size of the response bodies received, by endpoint",
+            [("", {"endpoint": key}, stats["bytes"]) for key, stats in endpoints],
+        )
+
+        # Histogram buckets are cumulative
+        samples = []
+        for key, stats in endpoints:
+            total = 0
+            for le, count in stats["latency_buckets"].items():
+                total += count
+                le = "+Inf" if le == "inf" else le
+                samples.append(("_bucket", {"endpoint": key, "le": le}, total))
+            samples.append(("_sum", {"endpoint": key}, stats["seconds"]))
+            count = sum(stats["requests"].values())
+            samples.append(("_count", {"endpoint": key}, count))
+        metric("request_seconds", "histogram", "Request latency, by endpoint", samples)
+
+        metric(
+            "rate_limit_points_total",
+            "counter",
+            "Rate limit points used, by resource",
+            [
+                ("", {"resource": resource}, points)
+                for resource, points in data["rate_limit_points"].items()
+            ],
+        )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, command):
+        """Writes `<command>.json` and `<command>.prom` to the metrics directory"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = os.path.join(self.directory, command)
+        write_atomic(f"{path}.json", json.dumps(self.to_dict(command), indent=2))
+
+        # The node exporter may read the textfile at any time
+        write_atomic(f"{path}.prom", self.to_prometheus(command))
+
+        print(f"\n* Metrics written to {path}.json and {path}.prom")
+
+
+# Shared by every command in the process
+metrics = Metrics()
+
+
+def endpoint(request):
+    """The request's method and path, with names and ids replaced, e.g.
+
+    GET /repos/{owner}/{repo}/hooks
+    """
+    parts = request.url.path.strip("/").split("/")
+
+    if parts[0] == "repos" and len(parts) >= 3:
+        parts[1:3] = ["{owner}", "{repo}"]
+    elif parts[0] == "orgs" and len(parts) >= 2:
+        parts[1] = "{org}"
+        if len(parts) >= 4 and parts[2] == "teams":
+            parts[3] = "{team_slug}"
+        if len(parts) >= 6 and parts[4] == "memberships":
+            parts[5] = "{username}"
+    elif parts[0] == "users" and len(parts) >= 2:
+        parts[1] = "{username}"
+
+    parts = ["{id}" if part.isdigit() else part for part in parts]
+    path = "/" + "/".join(parts)
+
+    return f"{request.method} {path}"
+
+
+def format_labels(**labels):
+    """e.g. {command="stats",endpoint="POST /graphql"}"""
+    escaped = {
+        name: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for name, value in labels.items()
+    }
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped.items()) + "}"
+
+
+def write_atomic(path, text):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,112 @@
+import os
+import re
+from functools import lru_cache
+
+QUERY_DIR = os.path.join(os.path.dirname(__file__), "graphql")
+
+
+@lru_cache(maxsize=None)
+def get_query(name):
+    """Reads a query, appending the fragments it pulls in with `#import`"""
+    with open(os.path.join(QUERY_DIR, f"{name}.graphql")) as f:
+        query = f.read()
+
+    for fragment in re.findall(r'^#import "(.+)\.graphql"', query, re.MULTILINE):
+        query += get_query(fragment)
+
+    return query
+
+
+@lru_cache(maxsize=None)
+def build_batch_query(fragment_file, count):
+    """Builds a query that runs a repository fragment against `count` repos
+
+    Each repo gets its own `$ownerN`/`$nameN` variables and is aliased `rN`,
+    so the whole batch costs a single round trip.
+    """
+
+    fragment = get_query(fragment_file)
+    fragment_name = re.search(r"fragment (\w+) on Repository", fragment).group(1)
+
+    variables = "$pageSize: Int!, " if "$pageSize" in fragment else ""
+    variables += ", ".join(
+        f"$owner{i}: String!, $name{i}: String!" for i in range(count)
+    )
+    repos = "\n".join(
+        f"  r{i}: repository(owner: $owner{i}, name: $name{i}) {{\n"
+        f"    ...{fragment_name}\n"
+        f"  }}"
+        for i in range(count)
+    )
+
+    rate_limit = "  rateLimit {\n    cost\n    remaining\n    resetAt\n  }"
+
+    return f"query ({variables}) {{\n{repos}\n{rate_limit}\n}}\n{fragment}"
+
+
+def build_batch_variables(repos, page_size=None):
+    """Builds the variables for a query returned by `build_batch_query`"""
+
+    variables = {} if page_size is None else {"pageSize": page_size}
+    for i, repo in enumerate(repos):
+        variables[f"owner{i}"] = repo["owner"]["login"]
+        variables[f"name{i}"] = repo["name"]
+
+    return variables
+
+
+def split_batch_response(response, count):
+    """Fans a batched response back out into one result per repo"""
+
+    return [response.get(f"r{i}") for i in range(count)]
+
+
+# Names, punctuation and string literals in a query, comments are dropped
+TOKENS = re.compile(r'#[^\n]*|"[^"]*"|\.\.\.|[\w$]+|[{}():]')
+
+
+@lru_cache(maxsize=None)
+def get_fields(name):
+    """The fields a query's first selection set asks for, as nested dicts
+
+    Fields are keyed by their alias if they have one, and map to the fields
+    selected under them, e.g. {"name": None, "owner": {"login": None}}.
+    """
+    tokens = [
+        token for token in TOKENS.findall(get_query(name)) if not token.startswith("#")
+    ]
+    position = tokens.index("{") + 1
+
+    def selection():
+        nonlocal position
+        fields = {}
+
+        while tokens[position] != "}":
+            if tokens[position] == "...":
+                raise ValueError(f"Fragment spreads aren't supported in {name}")
+
+            key = tokens[position]
+            position += 1
+
+            # An alias, e.g. `branches: refs(...)`
+            if tokens[position] == ":":
+                position += 2
+
+            # Skip the arguments
+            if tokens[position] == "(":
+                depth = 0
+                while True:
+                    depth += {"(": 1, ")": -1}.get(tokens[position], 0)
+                    position += 1
+                    if depth == 0:
+                        break
+
+            fields[key] = None
+            if tokens[position] == "{":
+                position += 1
+                fields[key] = selection()
+
+        position += 1
+        return fields
+
+    return selection()
@@ -0,0 +1,355 @@
+import json
+import time
+import hashlib
+import random
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+
+import httpx
+from githubkit.typing import RetryOption
+from githubkit.exception import RateLimitExceeded, RequestFailed
+
+from migrate.metrics import metrics
+
+###############################################################################
+# GitHub enforces two kinds of rate limits on every token:
+#
+# - Primary limits: a fixed number of points per hour, reported on every
+#   response in the X-RateLimit-* headers (and for GraphQL, in the
+#   `rateLimit { cost remaining resetAt }` object).
+# - Secondary limits: no more than 100 concurrent requests, and no more than
+#   900 REST / 2,000 GraphQL points per minute. Exceeding them returns a 403
+#   or 429, usually with a Retry-After header.
+#
+# https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+# https://docs.github.com/en/graphql/overview/rate-limits-and-node-limits-for-the-graphql-api
+###############################################################################
+
+# Points per minute allowed by the secondary limits
+SECONDARY_POINTS_PER_MINUTE = {"core": 900, "graphql": 2000}
+
+# Stay well under GitHub's 100 concurrent requests
+MAX_CONCURRENT_REQUESTS = 50
+
+# Points left untouched in each primary budget
+RESERVE = 50
+
+# Spread the remaining points evenly over the time to reset once less than
+# this fraction of the primary budget is left
+PACE_BELOW = 0.1
+
+
+@dataclass
+class Budget:
+    """What we know about one token's budget for one resource"""
+
+    limit: int = None
+    remaining: int = None
+    reset: float = None
+    next_request: float = 0
+    requests: int = 0
+    points: int = 0
+    window: deque = field(default_factory=deque)
+
+
+class RateLimiter:
+    """Paces requests so each token stays just under its rate limits"""
+
+    def __init__(self, reserve=RESERVE, pace_below=PACE_BELOW):
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.budgets = {}
+        self.blocked_until = {}
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def identify(self, request):
+        """Returns the id a request's token is tracked by"""
+        authorization = request.headers.get("authorization", "")
+        token = token_digest(authorization)
+        self.names.setdefault(token, redact(authorization))
+        return token
+
+    def budget(self, token, resource):
+        return self.budgets.setdefault((token, resource), Budget())
+
+    def reserve_request(self, token, resource, points=1):
+        """Returns how long to wait before sending a request
+
+        A return value of 0 means the request has been counted against the
+        budget and can be sent right away.
+        """
+        with self.lock:
+            now = time.time()
+            budget = self.budget(token, resource)
+            wait = self.blocked_until.get(token, 0) - now
+
+            # Primary limit
+            interval = 0
+            if budget.remaining is not None and budget.reset > now:
+                spare = budget.remaining - self.reserve
+                if spare <= 0:
+                    wait = max(wait, budget.reset - now)
+                elif budget.remaining < budget.limit * self.pace_below:
+                    interval = (budget.reset - now) / spare
+                    wait = max(wait, budget.next_request - now)
+
+            # Secondary limit
+            while budget.window and budget.window[0][0] <= now - 60:
+                budget.window.popleft()
+            per_minute = SECONDARY_POINTS_PER_MINUTE.get(resource)
+            if per_minute is not None:
+                if sum(p for _, p in budget.window) + points > per_minute:
+                    wait = max(wait, budget.window[0][0] + 60 - now)
+
+            if wait > 0:
+                return wait
+
+            budget.requests += 1
+            budget.window.append((now, points))
+            budget.next_request = now + interval
+            if budget.remaining is not None:
+                budget.remaining -= 1
+
+            return 0
+
+    def update(self, token, resource, response, cost=None):
+        """Records the budget GitHub reported on a response"""
+        headers = response.headers
+
+        with self.lock:
+            budget = self.budget(token, headers.get("x-ratelimit-resource", resource))
+
+            if "x-ratelimit-remaining" in headers:
+                budget.limit = int(headers["x-ratelimit-limit"])
+                budget.remaining = int(headers["x-ratelimit-remaining"])
+                budget.reset = int(headers["x-ratelimit-reset"])
+
+            # Conditional requests answered with a 304 are free
+            if response.status_code != 304:
+                budget.points += 1 if cost is None else cost
+
+            # Secondary limit hit, pause every request for this token
+            if response.status_code in (403, 429) and "retry-after" in headers:
+                self.blocked_until[token] = time.time() + int(headers["retry-after"])
+
+    def print_usage(self):
+        """Prints the budget used by each token during this run"""
+        if not self.budgets:
+            return
+
+        print("\n* Rate limit usage")
+        for (token, resource), budget in sorted(
+            self.budgets.items(),
+            key=lambda item: (self.names.get(item[0][0], ""), item[0]),
+        ):
+            line = (
+                f"** {self.names.get(token, token)} {resource}: "
+                f"{budget.requests} requests, {budget.points} points used"
+            )
+            if budget.remaining is not None:
+                reset = datetime.fromtimestamp(budget.reset).strftime("%H:%M:%S")
+                line += f", {max(budget.remaining, 0)}/{budget.limit} remaining"
+                line += f" (resets at {reset})"
+            print(line)
+
+
+# Shared by every client in the process
+rate_limiter = RateLimiter()
+
+
+def token_digest(authorization):
+    """Identifies the token in an Authorization header, without exposing it
+
+    Tokens are told apart by a digest of the whole token, as several tokens
+    can end in the same four characters.
+    """
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+
+def redact(authorization):
+    """The last four characters of an Authorization header's token, for display"""
+    if not authorization:
+        return "anonymous"
+    return f"...{authorization[-4:]}"
+
+
+def get_resource(request):
+    path = request.url.path
+    if path.endswith("/graphql"):
+        return "graphql"
+    elif "/search/" in path:
+        return "search"
+    return "core"
+
+
+def get_points(request, resource):
+    # Mutating REST requests cost 5 points against the secondary limit
+    if resource != "graphql" and request.method not in ("GET", "HEAD", "OPTIONS"):
+        return 5
+    return 1
+
+
+def get_graphql_cost(response):
+    """Returns the `rateLimit.cost` of a GraphQL response, if it was asked for"""
+    if b'"rateLimit"' not in response.content:
+        return None
+    try:
+        return json.loads(response.content)["data"]["rateLimit"]["cost"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def read_raw(response):
+    """The response's body as sent, i.e. still compressed"""
+    # Built in memory with its content, e.g. in tests
+    if response.is_stream_consumed:
+        return response.content
+
+    raw = b"".join(response.iter_raw())
+    response.close()
+    return raw
+
+
+async def aread_raw(response):
+    """The response's body as sent, i.e. still compressed"""
+    if response.is_stream_consumed:
+        return response.content
+
+    raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    await response.aclose()
+    return raw
+
+
+def buffered(request, response, raw):
+    """A copy of a response whose (still encoded) body has already been read
+
+    Its stream can be read again, e.g. by the cache and then by the client.
+    """
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=httpx.ByteStream(raw),
+        extensions=response.extensions,
+        request=request,
+    )
+
+
+class RateLimitTransport(httpx.BaseTransport):
+    """Sends every request through the rate limiter"""
+
+    def __init__(self, transport, limiter=rate_limiter):
+        self.transport = transport
+        self.limiter = limiter
+        self.slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+    def handle_request(self, request):
+        token = self.limiter.identify(request)
+        resource = get_resource(request)
+        points = get_points(request, resource)
+
+        while (wait := self.limiter.reserve_request(token, resource, points)) > 0:
+            time.sleep(wait)
+
+        with self.slots:
+            started = time.perf_counter()
+            response = self.transport.handle_request(request)
+
+            # Read the body, so its size is known
+            raw = read_raw(response)
+            response = buffered(request, response, raw)
+            metrics.record_request(
+                request, response, time.perf_counter() - started, len(raw)
+            )
+
+        cost = None
+        if resource == "graphql":
+            response.read()
+            cost = get_graphql_cost(response)
+
+        self.limiter.update(token, resource, response, cost)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitTransport(httpx.AsyncBaseTransport):
+    """Sends every request through the rate limiter"""
+
+    def __init__(self, transport, limiter=rate_limiter):
+        self.transport = transport
+        self.limiter = limiter
+        self.slots = asyncio.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def handle_async_request(self, request):
+        token = self.limiter.identify(request)
+        resource = get_resource(request)
+        points = get_points(request, resource)
+
+        while (wait := self.limiter.reserve_request(token, resource, points)) > 0:
+            await asyncio.sleep(wait)
+
+        async with self.slots:
+            started = time.perf_counter()
+            response = await self.transport.handle_async_request(request)
+
+            # Read the body, so its size is known
+            raw = await aread_raw(response)
+            response = buffered(request, response, raw)
+            metrics.record_request(
+                request, response, time.perf_counter() - started, len(raw)
+            )
+
+        cost = None
+        if resource == "graphql":
+            await response.aread()
+            cost = get_graphql_cost(response)
+
+        self.limiter.update(token, resource, response, cost)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class RetryWithBackoff:
+    """githubkit retry policy: back off with full jitter on rate limits and
+    server errors
+
+    Plain 403s (e.g. missing permissions) are not retried.
+    """
+
+    def __init__(self, max_retry=5, base=1, cap=60):
+        self.max_retry = max_retry
+        self.base = base
+        self.cap = cap
+
+    def jitter(self, retry_count):
+        return timedelta(
+            seconds=random.uniform(0, min(self.cap, self.base * 2**retry_count))
+        )
+
+    def __call__(self, exc, retry_count):
+        if retry_count >= self.max_retry:
+            return RetryOption(False)
+
+        if isinstance(exc, RateLimitExceeded):
+            return RetryOption(True, exc.retry_after + self.jitter(retry_count))
+
+        if isinstance(exc, RequestFailed):
+            status_code = exc.response.status_code
+            if (
+                status_code == 429
+                or status_code >= 500
+                or (status_code == 403 and "rate limit" in exc.response.text.lower())
+            ):
+                print(f"*** {status_code} from {exc.request.url}, retrying")
+                return RetryOption(True, self.jitter(retry_count))
+
+        return RetryOption(False)
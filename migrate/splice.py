@@ -0,0 +1,494 @@
+import io
+import os
+import re
+import copy
+import contextlib
+import zipfile
+import posixpath
+
+import openpyxl
+from lxml import etree
+
+###############################################################################
+# Sheet-level updates to an xlsx file
+#
+# An xlsx file is a zip of XML parts, with a part per worksheet. openpyxl
+# parses every sheet on load, including each earlier wave's inventory, timings
+# and results, and writes them all out again on save.
+#
+# A SplicedWorkbook only reads the list of sheets. Sheets added to it are
+# written by openpyxl to a scratch workbook, then their parts are spliced into
+# the zip: their cell formats are merged into the workbook's styles, and their
+# tables are renumbered. Deleted sheets are dropped along with their tables.
+# Every other part is copied across as it was, without being parsed.
+###############################################################################
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+CONTENT_TYPES = "[Content_Types].xml"
+
+# Relationship types
+OFFICE_DOCUMENT = f"{REL_NS}/officeDocument"
+WORKSHEET = f"{REL_NS}/worksheet"
+TABLE = f"{REL_NS}/table"
+STYLES = f"{REL_NS}/styles"
+SHARED_STRINGS = f"{REL_NS}/sharedStrings"
+CALC_CHAIN = f"{REL_NS}/calcChain"
+
+# Content types of the parts added
+PART_TYPES = {
+    WORKSHEET: "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml",
+    TABLE: "application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml",
+}
+
+# Styles the scratch workbook starts with, which stand for the workbook's own
+DEFAULT_STYLES = {"font": 1, "fill": 2, "border": 1, "xf": 1}
+
+
+def tag(name, namespace=MAIN_NS):
+    return f"{{{namespace}}}{name}"
+
+
+def to_xml(element):
+    return etree.tostring(
+        element, xml_declaration=True, encoding="UTF-8", standalone=True
+    )
+
+
+def rels_path(part):
+    """e.g. xl/_rels/workbook.xml.rels for xl/workbook.xml"""
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def resolve(part, target):
+    """The part a relationship of `part` points to"""
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def free_name(pattern, taken):
+    """The first of e.g. xl/tables/table1.xml, table2.xml... not in `taken`"""
+    number = 1
+    while pattern.format(number) in taken:
+        number += 1
+    return pattern.format(number)
+
+
+def related(archive, part, type):
+    """The parts `part` has a relationship of `type` with"""
+    if rels_path(part) not in archive.namelist():
+        return []
+    rels = etree.fromstring(archive.read(rels_path(part)))
+    return [resolve(part, rel.get("Target")) for rel in rels if rel.get("Type") == type]
+
+
+def workbook_part(archive):
+    return related(archive, "", OFFICE_DOCUMENT)[0]
+
+
+def sheet_parts(archive, book_part):
+    """Each sheet's name and part, in the order of the workbook's tabs"""
+    book = etree.fromstring(archive.read(book_part))
+    rels = etree.fromstring(archive.read(rels_path(book_part)))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+
+    return {
+        sheet.get("name"): resolve(book_part, targets[sheet.get(tag("id", REL_NS))])
+        for sheet in book.iter(tag("sheet"))
+    }
+
+
+@contextlib.contextmanager
+def replacing(path):
+    """A temp file to write instead of `path`, moved over it once it's complete
+
+    If the write fails, or the process dies part way, `path` is left as it
+    was.
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class SplicedWorkbook:
+    """The sheets of an xlsx file, to add and delete without loading the others
+
+    Takes the place of an openpyxl workbook for adding sheets. Only the sheets
+    created since the workbook was loaded can be read or written.
+    """
+
+    def __init__(self, path):
+        self.filename = path
+        self.load()
+
+    def load(self):
+        with zipfile.ZipFile(self.filename) as archive:
+            self.sheetnames = list(sheet_parts(archive, workbook_part(archive)))
+
+        # Sheets in the file that have been deleted, and the ones created since
+        self.deleted = set()
+        self.scratch = None
+
+    @property
+    def created(self):
+        return [] if self.scratch is None else self.scratch.sheetnames
+
+    @property
+    def changed(self):
+        return bool(self.deleted or self.created)
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self.created:
+            raise KeyError(f"Worksheet {sheet_name} wasn't created by this update.")
+        return self.scratch[sheet_name]
+
+    def __delitem__(self, sheet_name):
+        if sheet_name not in self.sheetnames:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+        self.sheetnames.remove(sheet_name)
+        if sheet_name in self.created:
+            self.scratch.remove(self.scratch[sheet_name])
+        else:
+            self.deleted.add(sheet_name)
+
+    def create_sheet(self, title, index=None):
+        if title in self.sheetnames:
+            raise ValueError(f"Worksheet {title} already exists.")
+
+        if self.scratch is None:
+            self.scratch = openpyxl.Workbook()
+            self.scratch.remove(self.scratch.active)
+
+        worksheet = self.scratch.create_sheet(title)
+        if index is None:
+            self.sheetnames.append(title)
+        else:
+            self.sheetnames.insert(index, title)
+
+        return worksheet
+
+    def save(self, path=None):
+        """Writes the changes to `path`, by default the file they were made to"""
+        path = path or self.filename
+
+        with replacing(path) as f:
+            self.splice(f)
+
+        self.filename = path
+        self.load()
+
+    def splice(self, output):
+        scratch = None
+        if self.created:
+            buffer = io.BytesIO()
+            self.scratch.save(buffer)
+            scratch = zipfile.ZipFile(buffer)
+
+        with zipfile.ZipFile(self.filename) as source:
+            parts, removed = self.spliced_parts(source, scratch)
+
+            with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+                for info in source.infolist():
+                    if info.filename in removed:
+                        continue
+                    data = parts.pop(info.filename, None)
+                    if data is None:
+                        data = source.read(info)
+                    archive.writestr(info, data)
+
+                for name, data in parts.items():
+                    archive.writestr(name, data)
+
+    def spliced_parts(self, source, scratch):
+        """The parts to add or replace, by name, and the ones to remove"""
+        book_part = workbook_part(source)
+        book = etree.fromstring(source.read(book_part))
+        book_rels = etree.fromstring(source.read(rels_path(book_part)))
+        types = etree.fromstring(source.read(CONTENT_TYPES))
+
+        sheets = {sheet.get("name"): sheet for sheet in book.iter(tag("sheet"))}
+        previous_order = list(sheets)
+        rels = {rel.get("Id"): rel for rel in book_rels}
+
+        parts = {}
+        removed = set()
+
+        for sheet_name in self.deleted:
+            rel = rels[sheets[sheet_name].get(tag("id", REL_NS))]
+            part = resolve(book_part, rel.get("Target"))
+            removed |= {part, rels_path(part), *related(source, part, TABLE)}
+            book_rels.remove(rel)
+
+        # The calculation chain lists cells by sheet, Excel rebuilds it
+        if self.deleted:
+            for rel in book_rels.findall(tag("Relationship", PACKAGE_REL_NS)):
+                if rel.get("Type") == CALC_CHAIN:
+                    removed.add(resolve(book_part, rel.get("Target")))
+                    book_rels.remove(rel)
+
+        for override in types.findall(tag("Override", CONTENT_TYPES_NS)):
+            if override.get("PartName")[1:] in removed:
+                types.remove(override)
+
+        # Removed parts' names can be reused
+        taken = set(source.namelist()) - removed
+        added = {}
+
+        if scratch is not None:
+            [styles_part] = related(source, book_part, STYLES)
+            scratch_book = workbook_part(scratch)
+            [scratch_styles] = related(scratch, scratch_book, STYLES)
+
+            parts[styles_part], xf_ids = merge_styles(
+                source.read(styles_part), scratch.read(scratch_styles)
+            )
+            next_table_id = max(table_ids_in(source, taken), default=0) + 1
+            table_names = set(table_names_in(source, taken))
+            next_sheet_id = max(int(sheet.get("sheetId")) for sheet in sheets.values())
+
+            for sheet_name, scratch_part in sheet_parts(scratch, scratch_book).items():
+                part = free_name("xl/worksheets/sheet{}.xml", taken)
+                taken.add(part)
+                parts[part] = restyled_sheet(scratch.read(scratch_part), xf_ids)
+                add_override(types, part, WORKSHEET)
+
+                # Tables are the only parts openpyxl relates to the sheets here
+                if rels_path(scratch_part) in scratch.namelist():
+                    sheet_rels = etree.fromstring(scratch.read(rels_path(scratch_part)))
+                    for rel in sheet_rels:
+                        if rel.get("Type") != TABLE:
+                            raise ValueError(f"Can't splice a {rel.get('Type')} part")
+
+                        table_part = free_name("xl/tables/table{}.xml", taken)
+                        taken.add(table_part)
+                        table = etree.fromstring(
+                            scratch.read(resolve(scratch_part, rel.get("Target")))
+                        )
+
+                        # As openpyxl checks for tables in the same workbook
+                        name = table.get("displayName")
+                        if name.lower() in table_names:
+                            raise ValueError(f"Table with name {name} already exists")
+                        table_names.add(name.lower())
+
+                        table.set("id", str(next_table_id))
+                        next_table_id += 1
+                        parts[table_part] = to_xml(table)
+                        add_override(types, table_part, TABLE)
+                        rel.set(
+                            "Target",
+                            posixpath.relpath(table_part, posixpath.dirname(part)),
+                        )
+                    parts[rels_path(part)] = to_xml(sheet_rels)
+
+                rel_id = free_name("rId{}", {rel.get("Id") for rel in book_rels})
+                etree.SubElement(
+                    book_rels,
+                    tag("Relationship", PACKAGE_REL_NS),
+                    Id=rel_id,
+                    Type=WORKSHEET,
+                    Target=posixpath.relpath(part, posixpath.dirname(book_part)),
+                )
+
+                next_sheet_id += 1
+                added[sheet_name] = {
+                    "name": sheet_name,
+                    "sheetId": str(next_sheet_id),
+                    tag("id", REL_NS): rel_id,
+                }
+
+        # Put the tabs in their new order. The sheets are moved rather than
+        # removed and re-added, which would redeclare their namespaces.
+        sheets_element = book.find(tag("sheets"))
+        for sheet_name in self.deleted:
+            sheets_element.remove(sheets[sheet_name])
+        for sheet_name in self.sheetnames:
+            if sheet_name in added:
+                etree.SubElement(sheets_element, tag("sheet"), added[sheet_name])
+            else:
+                sheets_element.append(sheets[sheet_name])
+
+        # Names and views refer to the sheets by position. A deleted sheet's
+        # names go with it, but a sheet replaced by one of the same name stays
+        # the active tab.
+        positions = {
+            index: self.sheetnames.index(sheet_name)
+            for index, sheet_name in enumerate(previous_order)
+            if sheet_name in self.sheetnames
+        }
+        for defined_name in list(book.iter(tag("definedName"))):
+            if defined_name.get("localSheetId") is None:
+                continue
+            index = int(defined_name.get("localSheetId"))
+            if previous_order[index] in self.deleted:
+                defined_name.getparent().remove(defined_name)
+            else:
+                defined_name.set("localSheetId", str(positions[index]))
+        for view in book.iter(tag("workbookView")):
+            for attribute in ("activeTab", "firstSheet"):
+                if view.get(attribute) is not None:
+                    position = positions.get(int(view.get(attribute)), 0)
+                    view.set(attribute, str(position))
+
+        parts[book_part] = to_xml(book)
+        parts[rels_path(book_part)] = to_xml(book_rels)
+        parts[CONTENT_TYPES] = to_xml(types)
+
+        return parts, removed
+
+
+def add_override(types, part, type):
+    etree.SubElement(
+        types,
+        tag("Override", CONTENT_TYPES_NS),
+        PartName=f"/{part}",
+        ContentType=PART_TYPES[type],
+    )
+
+
+def table_ids_in(archive, parts):
+    """The ids of the tables in `parts`, which must be unique in a workbook"""
+    for part in parts:
+        if part.startswith("xl/tables/"):
+            yield int(etree.fromstring(archive.read(part)).get("id"))
+
+
+def table_names_in(archive, parts):
+    """The lowercased names of the tables in `parts`, also unique in a workbook"""
+    for part in parts:
+        if part.startswith("xl/tables/"):
+            yield etree.fromstring(archive.read(part)).get("displayName").lower()
+
+
+###############################################################################
+# Styles
+###############################################################################
+
+
+def element_key(element):
+    """Compares elements by value, whatever their namespace declarations"""
+    return (
+        element.tag,
+        tuple(sorted(element.attrib.items())),
+        (element.text or "").strip(),
+        tuple(element_key(child) for child in element),
+    )
+
+
+def add_unique(container, element):
+    """Adds `element` to the list unless it has an equal one, returns its index"""
+    key = element_key(element)
+    for index, existing in enumerate(container):
+        if element_key(existing) == key:
+            return index
+
+    container.append(element)
+    if container.get("count") is not None:
+        container.set("count", str(len(container)))
+    return len(container) - 1
+
+
+def merge_list(styles, scratch_styles, name):
+    """Adds the scratch styles' fonts, fills or borders, returns their new ids"""
+    ids = {}
+    container = styles.find(tag(f"{name}s"))
+    for index, element in enumerate(scratch_styles.find(tag(f"{name}s"))):
+        if index < DEFAULT_STYLES[name]:
+            ids[index] = index
+        else:
+            ids[index] = add_unique(container, copy.deepcopy(element))
+    return ids
+
+
+def merge_number_formats(styles, scratch_styles):
+    """Adds the scratch styles' custom number formats, returns their new ids"""
+    ids = {}
+    scratch_formats = scratch_styles.find(tag("numFmts"))
+    if scratch_formats is None:
+        return ids
+
+    formats = styles.find(tag("numFmts"))
+    if formats is None:
+        # It has to be the first element of the stylesheet
+        formats = etree.Element(tag("numFmts"), count="0")
+        styles.insert(0, formats)
+
+    codes = {format.get("formatCode"): format.get("numFmtId") for format in formats}
+    for format in scratch_formats:
+        code = format.get("formatCode")
+        if code not in codes:
+            # Ids below 164 are Excel's built-in formats
+            id = max([163] + [int(id) for id in codes.values()]) + 1
+            etree.SubElement(formats, tag("numFmt"), numFmtId=str(id), formatCode=code)
+            formats.set("count", str(len(formats)))
+            codes[code] = str(id)
+        ids[format.get("numFmtId")] = codes[code]
+
+    return ids
+
+
+def merge_styles(styles, scratch_styles):
+    """Adds the cell formats of the scratch workbook's styles part to `styles`
+
+    Returns the new styles part, and the id in it of each scratch cell format.
+    """
+    styles = etree.fromstring(styles)
+    scratch_styles = etree.fromstring(scratch_styles)
+
+    ids = {
+        "fontId": merge_list(styles, scratch_styles, "font"),
+        "fillId": merge_list(styles, scratch_styles, "fill"),
+        "borderId": merge_list(styles, scratch_styles, "border"),
+    }
+    number_formats = merge_number_formats(styles, scratch_styles)
+
+    xf_ids = {}
+    cell_xfs = styles.find(tag("cellXfs"))
+    for index, xf in enumerate(scratch_styles.find(tag("cellXfs"))):
+        if index < DEFAULT_STYLES["xf"]:
+            xf_ids[b"%d" % index] = b"%d" % index
+            continue
+
+        xf = copy.deepcopy(xf)
+        for attribute, attribute_ids in ids.items():
+            if xf.get(attribute) is not None:
+                xf.set(attribute, str(attribute_ids[int(xf.get(attribute))]))
+        if xf.get("numFmtId") in number_formats:
+            xf.set("numFmtId", number_formats[xf.get("numFmtId")])
+        # Every cell format is based on the Normal style
+        xf.set("xfId", "0")
+
+        xf_ids[b"%d" % index] = b"%d" % add_unique(cell_xfs, xf)
+
+    return to_xml(styles), xf_ids
+
+
+###############################################################################
+# Sheets
+###############################################################################
+
+# A cell, row or column's cell format, e.g. <c r="A2" s="3" t="n">. Values
+# can't be mistaken for one, as the "<" in them are escaped.
+STYLE_ID = re.compile(rb'(<(?:c|row|col) [^>]*?\b(?:s|style)=")(\d+)"')
+
+
+def restyled_sheet(data, xf_ids):
+    """A scratch sheet's part, with the ids its cell formats have in the workbook
+
+    openpyxl writes strings inline, so the cell formats are all that refer
+    to the rest of the scratch workbook.
+    """
+    return STYLE_ID.sub(lambda match: match[1] + xf_ids[match[2]] + b'"', data)
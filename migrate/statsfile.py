@@ -0,0 +1,290 @@
+import os
+import csv
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+from migrate.queries import get_fields
+from migrate.counters import summary_fields
+from migrate.tables import find_table, with_format, FORMATS, COMPRESSION
+
+###############################################################################
+# The `gh migrate stats` CSV
+#
+# Its columns are fixed before the first repo is written: the fields of the
+# RepoFields fragment, the per-issue and per-PR counts, the REST API stats and
+# the run's own columns. Nested fields are flattened to dotted names, e.g.
+# "owner.login", in the order pandas.json_normalize puts them. A repo missing a
+# field gets an empty cell, and one with extra fields doesn't add columns.
+#
+# Rows are buffered and appended in batches. Once a run has finished, the file
+# can be converted to Parquet, with each column typed as below.
+###############################################################################
+
+# Fields counted across every issue and PR, by connection
+COUNTED_FIELDS = {
+    "issues": ["comments", "timelineItems"],
+    "pullRequests": ["comments", "commits", "timelineItems"],
+}
+
+# Stats added from the REST API, in the order get_rest_api_stats adds them
+REST_FIELDS = {
+    "webhooks": {"totalCount": None},
+    "workflows": {"totalCount": None},
+    "lastWorkflowRun": None,
+    "branches": None,
+    "teams": None,
+    "environments": None,
+    "secrets_actions_repo": None,
+    "secrets_actions_org": None,
+    "secrets_dependabot": None,
+    "secrets_codespaces": None,
+    "topics": None,
+    "permissions": {
+        "admin": None,
+        "maintain": None,
+        "push": None,
+        "triage": None,
+        "pull": None,
+    },
+    "visibility": None,
+    "security_and_analysis": {
+        feature: {"status": None}
+        for feature in [
+            "advanced_security",
+            "secret_scanning",
+            "secret_scanning_push_protection",
+            "dependabot_security_updates",
+        ]
+    },
+    "hasGitLFS": None,
+}
+
+# Rows buffered before they're appended to the file
+WRITE_BATCH = 100
+
+# Column types, any column not listed is a string. Counts are held as nullable
+# 32-bit ints, and strings that repeat from repo to repo as categoricals.
+INT_COLUMNS = {
+    "diskUsage",
+    "forkCount",
+    "environments",
+    "secrets_actions_repo",
+    "secrets_actions_org",
+    "secrets_dependabot",
+    "secrets_codespaces",
+}
+BOOL_COLUMNS = {"isLocked", "hasWikiEnabled", "isFork", "isArchived", "hasGitLFS"}
+DATE_COLUMNS = {"createdAt", "pushedAt", "updatedAt", "lastWorkflowRun", "Inventoried"}
+CATEGORY_COLUMNS = {
+    "lockReason",
+    "visibility",
+    "Source",
+    "owner.login",
+    "teams",
+    "topics",
+}
+
+# The dtype each type of column is held in
+DTYPES = {
+    "int": "UInt32",
+    "bool": "boolean",
+    "date": "datetime64[ns]",
+    "category": "category",
+    "str": "object",
+}
+
+# GitHub's timestamps, e.g. "2024-04-12T01:25:50Z"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def stats_fields(distribution=False):
+    """Every field of a stats row, as nested dicts"""
+    fields = dict(get_fields("repo-fields"))
+
+    # The first page of issues and PRs is dropped once it's been counted
+    for connection, counted in COUNTED_FIELDS.items():
+        fields[connection] = {
+            "totalCount": None,
+            **{field: dict.fromkeys(summary_fields(distribution)) for field in counted},
+        }
+
+    # REST branches replace the GraphQL count, in the same place
+    fields.update(REST_FIELDS)
+
+    fields["Source"] = None
+    fields["Inventoried"] = None
+
+    return fields
+
+
+def column_paths(fields):
+    """The path to each leaf field, top-level ones first as json_normalize does"""
+    paths = [(key,) for key, value in fields.items() if value is None]
+    for key, value in fields.items():
+        if value is not None:
+            paths += leaf_paths(value, (key,))
+    return paths
+
+
+def leaf_paths(fields, prefix):
+    """The path to each leaf field, depth first"""
+    paths = []
+    for key, value in fields.items():
+        if value is None:
+            paths.append(prefix + (key,))
+        else:
+            paths += leaf_paths(value, prefix + (key,))
+    return paths
+
+
+def stats_columns(distribution=False):
+    """The columns of a stats file, in order"""
+    return [".".join(path) for path in column_paths(stats_fields(distribution))]
+
+
+def column_type(column):
+    """ "int", "bool", "date", "category" or "str" """
+    if column in INT_COLUMNS or column.rsplit(".", 1)[-1] in summary_fields(True):
+        return "int"
+    if column in BOOL_COLUMNS or column.startswith("permissions."):
+        return "bool"
+    if column in DATE_COLUMNS:
+        return "date"
+    if column in CATEGORY_COLUMNS or column.startswith("security_and_analysis."):
+        return "category"
+    return "str"
+
+
+def typed(df):
+    """Stats with each column converted to its dtype
+
+    Takes stats read as strings, or typed by an older schema. Dates are in
+    UTC, without a time zone, as Excel has none.
+    """
+    df = df.copy()
+    for column in df.columns:
+        type = column_type(column)
+        values = df[column]
+        if values.dtype == DTYPES[type]:
+            continue
+
+        if type == "int":
+            values = pd.to_numeric(values, errors="coerce")
+        elif type == "bool" and values.dtype == object:
+            values = values.map(
+                {"True": True, "False": False, True: True, False: False}
+            )
+        elif type == "date":
+            values = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+            values = values.dt.tz_localize(None)
+
+        df[column] = values.astype(DTYPES[type])
+    return df
+
+
+def as_strings(df):
+    """Typed stats, or any table, as the strings a stats file would hold"""
+    df = df.copy()
+    for column in df.columns:
+        missing = df[column].isna()
+        if is_datetime64_any_dtype(df[column]) and column != "Inventoried":
+            values = df[column].dt.strftime(TIMESTAMP_FORMAT)
+        else:
+            values = df[column].astype(object).map(str)
+        df[column] = values.where(~missing, "").astype(object)
+    return df
+
+
+def read_stats(path, strings=False):
+    """Reads a stats file, saved as CSV or Parquet, with typed columns
+
+    With `strings`, every value is read as it was written to the CSV, and
+    missing values are empty strings.
+    """
+    path = find_table(path)
+
+    if path.endswith(FORMATS["parquet"]):
+        df = pd.read_parquet(path)
+        return as_strings(df) if strings else typed(df)
+
+    if strings:
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    # The parser infers numbers and booleans quickly, and typed() narrows them.
+    # Everything else is read as strings.
+    dtypes = {
+        column: DTYPES["category"] if column_type(column) == "category" else str
+        for column in read_header(path) or []
+        if column_type(column) not in ("int", "bool")
+    }
+    return typed(pd.read_csv(path, dtype=dtypes))
+
+
+def convert_stats(path, format):
+    """Converts a finished stats file to `format`, returns its new path"""
+    if format == "csv" or not os.path.exists(path):
+        return with_format(path, format)
+
+    parquet_path = with_format(path, format)
+    read_stats(path).to_parquet(parquet_path, index=False, compression=COMPRESSION)
+    os.remove(path)
+
+    return parquet_path
+
+
+def read_header(path):
+    with open(path, "r", newline="") as f:
+        return next(csv.reader(f), None)
+
+
+class StatsWriter:
+    """Appends repos to a stats file, `WRITE_BATCH` rows at a time
+
+    Rows can be nested dicts, as the repo was fetched, or already flattened
+    with dotted keys, as read back from a previous stats file.
+    """
+
+    def __init__(self, path, columns, batch_size=WRITE_BATCH):
+        self.path = path
+        self.columns = columns
+        self.paths = [tuple(column.split(".")) for column in columns]
+        self.batch_size = batch_size
+        self.rows = []
+        self.checked = False
+
+    def flatten(self, record):
+        row = []
+        for column, path in zip(self.columns, self.paths):
+            if column in record:
+                value = record[column]
+            else:
+                value = record
+                for key in path:
+                    value = value.get(key) if isinstance(value, dict) else None
+            row.append(value)
+        return row
+
+    def write(self, record):
+        """Buffers a row, returns True once the buffer should be flushed"""
+        self.rows.append(self.flatten(record))
+        return len(self.rows) >= self.batch_size
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        with open(self.path, "a", newline="") as f:
+            if f.tell() == 0:
+                csv.writer(f, lineterminator="\n").writerow(self.columns)
+            elif not self.checked and read_header(self.path) != self.columns:
+                # e.g. resuming a run that was started without --distribution
+                raise ValueError(
+                    f"{self.path} was written with different columns, "
+                    "re-run without --resume to start it over"
+                )
+            self.checked = True
+
+            csv.writer(f, lineterminator="\n").writerows(self.rows)
+
+        self.rows = []
@@ -0,0 +1,73 @@
+import os
+import importlib.util
+
+import pandas as pd
+
+###############################################################################
+# Tables saved by one command and read by another
+#
+# Stats files and snapshots are CSV by default. They can be saved as Parquet
+# instead, with typed, compressed columns, which needs pyarrow. Readers ask
+# for the CSV path, and get whichever of `<name>.csv` and `<name>.parquet`
+# was saved last.
+###############################################################################
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet"}
+
+COMPRESSION = "zstd"
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def with_format(path, format):
+    """`path` with the format's extension, e.g. logs/stats.parquet"""
+    return os.path.splitext(path)[0] + FORMATS[format]
+
+
+def find_table(path):
+    """The file a table was last saved to, in any format
+
+    Returns `path` itself if the table hasn't been saved.
+    """
+    saved = [
+        candidate
+        for candidate in [with_format(path, format) for format in FORMATS]
+        if os.path.exists(candidate)
+    ]
+    if not saved:
+        return path
+    return max(saved, key=os.path.getmtime)
+
+
+def load_table(path, **csv_kwargs):
+    """Reads a table saved by `save_table`, `csv_kwargs` only apply to CSV"""
+    path = find_table(path)
+    if path.endswith(FORMATS["parquet"]):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, **csv_kwargs)
+
+
+def save_table(df, path, format="csv"):
+    """Writes df to `path` with the format's extension, returns the path"""
+    path = with_format(path, format)
+    if format == "parquet":
+        columnar(df).to_parquet(path, index=False, compression=COMPRESSION)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def columnar(df):
+    """df with the values Parquet can't type, e.g. nested objects, as strings
+
+    The strings are what CSV would have held, so either format reads back
+    the same.
+    """
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if not values.map(lambda value: isinstance(value, str)).all():
+            df[column] = df[column].map(str).where(df[column].notna(), None)
+    return df
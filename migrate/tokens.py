@@ -0,0 +1,130 @@
+import time
+import threading
+from datetime import datetime
+
+import httpx
+
+from migrate.ratelimit import rate_limiter, redact, token_digest, get_resource
+
+###############################################################################
+# A wave's inventory can need more points than one token has in an hour. With
+# several tokens for the same enterprise, each request is sent with whichever
+# token has the most of its budget left, as tracked by the rate limiter.
+#
+# A token whose budget is spent is retired until its reset time. If every
+# token is retired, requests go out with the one that resets first, and the
+# rate limiter holds them until it does.
+###############################################################################
+
+
+class TokenPool:
+    """Spreads requests across several tokens"""
+
+    def __init__(self, tokens, limiter=rate_limiter):
+        # Tokens by the id the rate limiter knows them by
+        self.tokens = {token_digest(f"token {token}"): token for token in tokens}
+        self.limiter = limiter
+
+        # How each token is shown, numbered if several end alike
+        names = [redact(f"token {token}") for token in self.tokens.values()]
+        self.names = {
+            key: (
+                f"{name} #{names[:i].count(name) + 1}"
+                if names.count(name) > 1
+                else name
+            )
+            for i, (key, name) in enumerate(zip(self.tokens, names))
+        }
+        limiter.names.update(self.names)
+        self.requests = dict.fromkeys(self.tokens, 0)
+        self.retired = {}
+        self.lock = threading.Lock()
+
+    def available_at(self, token_id, resource, now):
+        """When the token can next be used, `now` if it has budget left"""
+        budget = self.limiter.budget(token_id, resource)
+        until = self.limiter.blocked_until.get(token_id, now)
+
+        if (
+            budget.remaining is not None
+            and budget.reset > now
+            and budget.remaining <= self.limiter.reserve
+        ):
+            until = max(until, budget.reset)
+
+        return max(until, now)
+
+    def choose(self, resource):
+        """Returns the id of the token to send the next request with"""
+        with self.lock:
+            now = time.time()
+
+            available = []
+            for token_id in self.tokens:
+                until = self.available_at(token_id, resource, now)
+                if until > now:
+                    if self.retired.get(token_id, 0) < until:
+                        reset = datetime.fromtimestamp(until).strftime("%H:%M:%S")
+                        print(
+                            f"*** Token {self.names[token_id]} exhausted, retired until {reset}"
+                        )
+                    self.retired[token_id] = until
+                    continue
+
+                budget = self.limiter.budget(token_id, resource)
+                remaining = (
+                    float("inf") if budget.remaining is None else budget.remaining
+                )
+                available.append((-remaining, self.requests[token_id], token_id))
+
+            if available:
+                token_id = min(available)[2]
+            else:
+                token_id = min(self.tokens, key=lambda t: self.retired[t])
+
+            self.requests[token_id] += 1
+            return token_id
+
+    def authorize(self, request):
+        token_id = self.choose(get_resource(request))
+        request.headers["Authorization"] = f"token {self.tokens[token_id]}"
+
+    def print_usage(self):
+        """Prints the number of requests sent with each token"""
+        print("\n* Token pool usage")
+        for token_id, requests in self.requests.items():
+            line = f"** {self.names[token_id]}: {requests} requests"
+            if self.retired.get(token_id, 0) > time.time():
+                reset = datetime.fromtimestamp(self.retired[token_id])
+                line += f", retired until {reset.strftime('%H:%M:%S')}"
+            print(line)
+
+
+class TokenPoolTransport(httpx.BaseTransport):
+    """Sends each request with the pool's choice of token"""
+
+    def __init__(self, transport, pool):
+        self.transport = transport
+        self.pool = pool
+
+    def handle_request(self, request):
+        self.pool.authorize(request)
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncTokenPoolTransport(httpx.AsyncBaseTransport):
+    """Sends each request with the pool's choice of token"""
+
+    def __init__(self, transport, pool):
+        self.transport = transport
+        self.pool = pool
+
+    async def handle_async_request(self, request):
+        self.pool.authorize(request)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
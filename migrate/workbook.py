@@ -1,4 +1,5 @@
 import os
+import contextlib
 import pandas as pd
 
 import pytz
@@ -9,6 +10,10 @@ from openpyxl.styles import Font
 from openpyxl import load_workbook
 from openpyxl.worksheet.table import TableStyleInfo
 
+from migrate.mapping import get_mapping_index
+from migrate.metrics import metrics
+from migrate.splice import SplicedWorkbook, replacing
+
 # Create a table style
 table_style = TableStyleInfo(
     name="TableStyleMedium9", showFirstColumn=False, showLastColumn=False
@@ -17,30 +22,41 @@ table_style = TableStyleInfo(
 
 def initialize_workbook():
     workbook = load_workbook(os.path.join("report", "template", "workbook.xlsx"))
-    workbook.save(os.path.join("report", "InfoMagnus - Migration Workbook.xlsx"))
+    with replacing(os.path.join("report", "InfoMagnus - Migration Workbook.xlsx")) as f:
+        workbook.save(f)
 
 
 def get_workbook(workbook_path):
-    workbook = load_workbook(workbook_path)
-    workbook.filename = workbook_path
+    """The workbook's list of sheets, to add sheets to and delete them from
+
+    The sheets themselves aren't loaded, and saving only writes the ones
+    that were added.
+    """
+    with metrics.phase("workbook.load"):
+        workbook = SplicedWorkbook(workbook_path)
     print(f"** Found workbook at: {workbook_path}")
 
     return workbook
 
 
-def get_mannequin_df(workbook_path):
-    # Load the Org Mappings
-    wb = load_workbook(workbook_path, data_only=True)
+@contextlib.contextmanager
+def workbook_session(workbook_path):
+    """The workbook, for a command to make all of its sheet changes to
 
-    ws = wb["Mapping - User"]
+    They're saved together once the `with` block finishes, with a single
+    write of the workbook. If the block raises, none of them are saved.
+    """
+    workbook = get_workbook(workbook_path)
+    yield workbook
 
-    data = list(ws.values)
+    if workbook.changed:
+        with metrics.phase("workbook.save"):
+            workbook.save()
 
-    # Set the first row as the header
-    df = pd.DataFrame(data[1:], columns=data[0])
 
-    # Get orgs for wave, filter out excluded orgs
-    users = df[(df["exclude"] == False)]
+def get_mannequin_df(workbook_path):
+    # Get users, filter out excluded users
+    users = get_mapping_index(workbook_path).users()
 
     # If orgs is empty
     if users.empty:
@@ -50,18 +66,8 @@ def get_mannequin_df(workbook_path):
 
 
 def get_included_orgs(org_type, workbook_path):
-    # Load the Org Mappings
-    wb = load_workbook(workbook_path, data_only=True)
-
-    ws = wb["Mapping - Org"]
-
-    data = list(ws.values)
-
-    # Set the first row as the header
-    df = pd.DataFrame(data[1:], columns=data[0])
-
     # Filter out excluded orgs
-    orgs = df[df["exclude"] == False][org_type].tolist()
+    orgs = get_mapping_index(workbook_path).orgs()[org_type].tolist()
 
     if orgs == ():
         raise ValueError("No source orgs found in 'Mapping - Org'")
@@ -70,18 +76,8 @@ def get_included_orgs(org_type, workbook_path):
 
 
 def get_included_orgs_by_wave(org_type, wave, workbook_path):
-    # Load the Org Mappings
-    wb = load_workbook(workbook_path, data_only=True)
-
-    ws = wb["Mapping - Org"]
-
-    data = list(ws.values)
-
-    # Set the first row as the header
-    df = pd.DataFrame(data[1:], columns=data[0])
-
     # Get orgs for wave, filter out excluded orgs
-    orgs = df[(df["exclude"] == False) & (df["wave"] == wave)][org_type].tolist()
+    orgs = get_mapping_index(workbook_path).orgs(wave)[org_type].tolist()
 
     # If orgs is empty
     if orgs == ():
@@ -91,18 +87,8 @@ def get_included_orgs_by_wave(org_type, wave, workbook_path):
 
 
 def get_included_orgs_by_wave_df(org_type, wave, workbook_path):
-    # Load the Org Mappings
-    wb = load_workbook(workbook_path, data_only=True)
-
-    ws = wb["Mapping - Org"]
-
-    data = list(ws.values)
-
-    # Set the first row as the header
-    df = pd.DataFrame(data[1:], columns=data[0])
-
     # Get orgs for wave, filter out excluded orgs
-    orgs = df[(df["exclude"] == False) & (df["wave"] == wave)]
+    orgs = get_mapping_index(workbook_path).orgs(wave)
 
     # If orgs is empty
     if orgs.empty:
@@ -121,22 +107,47 @@ def add_sheet(workbook, sheet_name, desired_index=0, tab_color="FF0000"):
     return worksheet
 
 
-def autosize_columns(worksheet):
-    for column in worksheet.columns:
-        max_length = 0
-        column = column[0].column_letter
-        for cell in worksheet[column]:
-            try:  # Necessary to avoid error on empty cells
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
+def column_lengths(df):
+    """Length of the longest string in each column, heading included
+
+    Numbers and dates aren't counted, as in Excel they're shown in the
+    column's number format.
+    """
+    lengths = {}
+    for index, column in enumerate(df.columns, start=1):
+        length = len(column) if isinstance(column, str) else 0
+        try:
+            longest = df[column].str.len().max()
+        except AttributeError:
+            # Not a column of strings
+            longest = None
+        if pd.notna(longest):
+            length = max(length, int(longest))
+        lengths[index] = length
+
+    return lengths
+
+
+def autosize_columns(worksheet, lengths):
+    """Sizes each column to fit its longest string, up to a width of 60"""
+    for index in range(1, worksheet.max_column + 1):
+        max_length = lengths.get(index, 0)
         adjusted_width = (max_length + 2) * 1.2
         adjusted_width = min(adjusted_width, 60)
+        column = openpyxl.utils.get_column_letter(index)
         worksheet.column_dimensions[column].width = adjusted_width
 
 
-def write_table(worksheet, df, table_name, heading=""):
+@metrics.timed("workbook.write_table")
+def write_table(worksheet, df, table_name, heading="", lengths=None):
+    """Appends df to the worksheet as an Excel table
+
+    Pass the same `lengths` dict for every table on a sheet, so the columns
+    are sized to fit all of them.
+    """
+    if lengths is None:
+        lengths = {}
+
     # If pushedAt exists in the df
     if "pushedAt" in df.columns:
         df["pushedAt"] = df["pushedAt"].dt.tz_localize(None)
@@ -147,6 +158,7 @@ def write_table(worksheet, df, table_name, heading=""):
     if heading != "":
         worksheet.append([heading])
         worksheet[f"A{worksheet.max_row}"].font = Font(bold=True, size=12)
+        lengths[1] = max(lengths.get(1, 0), len(heading))
 
     # If there are no rows, add a single row with "No data"
     if df.empty:
@@ -171,14 +183,20 @@ def write_table(worksheet, df, table_name, heading=""):
         )
         worksheet.add_table(table)
 
-        # Add the data
+        # Add the data, typed columns' missing values as empty cells
         worksheet.append(df.columns.to_list())
-        for row in df.itertuples(index=False, name=None):
+        values = df
+        if df.isna().to_numpy().any():
+            values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
             worksheet.append(row)
 
         # Group added rows
         worksheet.row_dimensions.group(start_row + 1, end_row, hidden=False)
-        autosize_columns(worksheet)
+
+        for index, length in column_lengths(df).items():
+            lengths[index] = max(lengths.get(index, 0), length)
+        autosize_columns(worksheet, lengths)
 
     # Move to the next empty row
     worksheet.append([])
@@ -264,8 +282,6 @@ def add_org_mapping(workbook, sheet_name, stats):
     # Create org mapping table
     write_table(worksheet, stats, "Mapping_Org")
 
-    workbook.save(workbook.filename)
-
 
 def add_pre_migration_report(workbook, sheet_name, stats):
     """ """
@@ -279,23 +295,26 @@ def add_pre_migration_report(workbook, sheet_name, stats):
     # Clear the contents of the worksheet
     worksheet.delete_rows(1, worksheet.max_row)
 
+    # Column widths to fit every table on the sheet
+    lengths = {}
+
     # Create large repos table
     df = stats[stats["diskUsage"] > 1000].sort_values(by="diskUsage")
-    write_table(worksheet, df, "Large_Repos", "Large Repos")
+    write_table(worksheet, df, "Large_Repos", "Large Repos", lengths)
 
     # Create large PRs table
     df = stats[stats["pullRequests.totalCount"] > 1000].sort_values(
         by="pullRequests.totalCount"
     )
-    write_table(worksheet, df, "Large_PRs", "Large PRs")
+    write_table(worksheet, df, "Large_PRs", "Large PRs", lengths)
 
     # Create webhooks table
     df = stats[stats["webhooks.totalCount"] > 0].sort_values(by="webhooks.totalCount")
-    write_table(worksheet, df, "Webhooks_Repos", "Repos with webhooks")
+    write_table(worksheet, df, "Webhooks_Repos", "Repos with webhooks", lengths)
 
     # Create actions table
     df = stats[stats["lastWorkflowRun"] != None].sort_values("lastWorkflowRun")
-    write_table(worksheet, df, "Actions_Repos", "Repos with actions")
+    write_table(worksheet, df, "Actions_Repos", "Repos with actions", lengths)
 
     # Create stale repos table
     stats["pushedAt"] = stats["pushedAt"].dt.tz_localize("UTC")
@@ -303,21 +322,19 @@ def add_pre_migration_report(workbook, sheet_name, stats):
         stats["pushedAt"]
         < datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=60)
     ].sort_values("pushedAt")
-    write_table(worksheet, df, "Stale_Repos", "Stale Repos")
+    write_table(worksheet, df, "Stale_Repos", "Stale Repos", lengths)
 
     # Create archived repos table
     df = stats[stats["isArchived"] == True].sort_values("isArchived")
-    write_table(worksheet, df, "Archived_Repos", "Archived Repos")
+    write_table(worksheet, df, "Archived_Repos", "Archived Repos", lengths)
 
     # Create locked repos table
     df = stats[stats["isLocked"] == True].sort_values("isLocked")
-    write_table(worksheet, df, "Locked_Repos", "Locked Repos")
+    write_table(worksheet, df, "Locked_Repos", "Locked Repos", lengths)
 
     # Create repos with packages table
     df = stats[stats["packages.totalCount"] > 0].sort_values("packages.totalCount")
-    write_table(worksheet, df, "Has_Packages", "Repos with packages")
+    write_table(worksheet, df, "Has_Packages", "Repos with packages", lengths)
 
     # def identify_git_lfs():
     # # TODO: Need to figure out how to implement this
-
-    workbook.save(workbook.filename)